@@ -1,15 +1,115 @@
-import aiohttp
 import asyncio
 import ssl
 import certifi
-from typing import List, Dict, Optional
+import httpx
+import orjson
+import heapq
+import logging
+from functools import wraps
+from operator import itemgetter
+from typing import Any, List, Dict, Optional, Tuple, Union
 import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Columnar layout for OHLCV candles returned by get_klines
+KLINE_DTYPE = np.dtype([
+    ('timestamp', 'i8'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8')
+])
+
+# Stablecoin bases excluded from the top-volume ranking; a tuple so that
+# str.startswith checks every prefix in a single C-level call
+_STABLE_PREFIXES = ('USDC', 'BUSD', 'TUSD', 'DAI', 'FDUSD', 'USDP')
+
+# Errors a Binance call is expected to fail with: transport failures and
+# timeouts (httpx.HTTPError), and undecodable bodies (orjson.JSONDecodeError
+# is a ValueError). Anything else is a bug and should propagate.
+_FETCH_ERRORS = (httpx.HTTPError, ValueError)
+
+
+def _parse_klines(data: List[List]) -> np.ndarray:
+    """Convert raw Binance kline rows into a KLINE_DTYPE structured array"""
+    n = len(data)
+    klines = np.empty(n, dtype=KLINE_DTYPE)
+    klines['timestamp'] = np.fromiter((k[0] for k in data), dtype=np.int64, count=n)
+    # Parse one column at a time straight into float64 storage; map(float)
+    # avoids both per-row dicts and intermediate object arrays
+    for i, name in enumerate(KLINE_DTYPE.names[1:], start=1):
+        klines[name] = np.fromiter(
+            map(float, (k[i] for k in data)), dtype=np.float64, count=n
+        )
+    return klines
+
+
+class _TTLCache:
+    """Small in-memory cache whose entries expire after `ttl` seconds"""
+    
+    def __init__(self, ttl: float = 10.0):
+        self.ttl = ttl
+        self._store: Dict[str, Tuple[float, Any]] = {}
+    
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._store[key]
+            return None
+        return value
+    
+    def set(self, key: str, value: Any):
+        self._store[key] = (time.monotonic(), value)
+    
+    def clear(self):
+        self._store.clear()
+
+
+def _copy_payload(value: Any) -> Any:
+    """Copy a cached payload so callers can't mutate the cached object"""
+    if isinstance(value, list):
+        return [dict(v) if isinstance(v, dict) else v for v in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+def _ttl_cached(method):
+    """Cache a fetcher coroutine's non-empty results in the shared TTL cache.
+    
+    Pass `force_refresh=True` to bypass the cache for a single call.
+    """
+    @wraps(method)
+    async def wrapper(self, *args, force_refresh: bool = False, **kwargs):
+        key = f"{method.__name__}:{args!r}:{sorted(kwargs.items())!r}"
+        if not force_refresh:
+            cached = self._ticker_cache.get(key)
+            if cached is not None:
+                return _copy_payload(cached)
+        result = await method(self, *args, **kwargs)
+        # Don't cache failures so the next call retries
+        if result:
+            self._ticker_cache.set(key, _copy_payload(result))
+        return result
+    return wrapper
+
 
 class CryptoDataFetcher:
     """Fetch crypto data from Binance API"""
     
     BINANCE_API = "https://data-api.binance.vision/api/v3"
     
+    # Pre-parsed endpoint URLs so the client doesn't re-parse a string per call
+    EXCHANGE_INFO_URL = httpx.URL(f"{BINANCE_API}/exchangeInfo")
+    KLINES_URL = httpx.URL(f"{BINANCE_API}/klines")
+    TICKER_24H_URL = httpx.URL(f"{BINANCE_API}/ticker/24hr")
+    
     INTERVALS = {
         '5m': '5m',
         '15m': '15m', 
@@ -20,47 +120,92 @@ class CryptoDataFetcher:
         '1w': '1w'
     }
     
+    # Shared HTTP/2 client, reused across fetcher instances so that the
+    # multiplexed connection (one TLS handshake) survives between requests
+    _shared_session: Optional[httpx.AsyncClient] = None
+    _shared_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    # 24h ticker data changes slowly; share it across instances for a few seconds
+    _ticker_cache = _TTLCache(ttl=10.0)
+    _TICKER_INDEX_KEY = "ticker_index"
+    
     def __init__(self):
-        self.session: Optional[aiohttp.ClientSession] = None
+        self.session: Optional[httpx.AsyncClient] = None
+        self._index_lock = asyncio.Lock()
         
-    async def __aenter__(self):
+    @staticmethod
+    def _create_session() -> httpx.AsyncClient:
         ssl_context = ssl.create_default_context(cafile=certifi.where())
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        self.session = aiohttp.ClientSession(connector=connector)
+        # HTTP/2 multiplexes concurrent requests to Binance over one socket
+        return httpx.AsyncClient(
+            http2=True,
+            verify=ssl_context,
+            limits=httpx.Limits(
+                max_connections=64,
+                max_keepalive_connections=32,
+                keepalive_expiry=75
+            ),
+            timeout=httpx.Timeout(10.0)
+        )
+        
+    async def __aenter__(self):
+        cls = type(self)
+        loop = asyncio.get_running_loop()
+        # Pooled connections are bound to the loop they were opened on, so
+        # rebuild the client if it was closed or belongs to a different loop
+        if (cls._shared_session is None or cls._shared_session.is_closed
+                or cls._shared_loop is not loop):
+            # A client from another loop cannot be aclose()d from this one,
+            # so it is simply replaced
+            cls._shared_session = cls._create_session()
+            cls._shared_loop = loop
+        self.session = cls._shared_session
         return self
         
     async def __aexit__(self, *args):
-        if self.session:
-            await self.session.close()
+        cls = type(self)
+        if self.session is None:
+            return
+        # Keep the shared pool warm for the next caller; it is closed on shutdown
+        if self.session is not cls._shared_session:
+            await self.session.aclose()
+        self.session = None
     
+    @classmethod
+    async def close_shared_session(cls):
+        """Close the shared connection pool (call on application shutdown)"""
+        session = cls._shared_session
+        cls._shared_session = None
+        cls._shared_loop = None
+        if session and not session.is_closed:
+            await session.aclose()
+    
+    @_ttl_cached
     async def get_top_symbols(self, limit: int = 100) -> List[str]:
         """Get top trading pairs by volume that are actively TRADING"""
         # 1. Get valid trading symbols
-        info_url = f"{self.BINANCE_API}/exchangeInfo"
         valid_symbols = set()
         
         try:
-            async with self.session.get(info_url) as response:
-                if response.status == 200:
-                    data = await response.json()
+            async with self.session.stream("GET", self.EXCHANGE_INFO_URL) as response:
+                if response.status_code == 200:
+                    data = orjson.loads(await response.aread())
                     for s in data['symbols']:
                         if s['status'] == 'TRADING' and s['symbol'].endswith('USDT'):
                             valid_symbols.add(s['symbol'])
         except Exception as e:
-            print(f"Error fetching exchange info: {e}")
+            logger.warning("Error fetching exchange info: %s", e)
             # Fallback to loose filtering if exchange info fails
             pass
             
         # 2. Get ticker data
-        url = f"{self.BINANCE_API}/ticker/24hr"
-        
-        async with self.session.get(url) as response:
-            if response.status != 200:
+        async with self.session.stream("GET", self.TICKER_24H_URL) as response:
+            if response.status_code != 200:
                 return []
             
-            data = await response.json()
+            data = orjson.loads(await response.aread())
             
-            # Filter USDT pairs and sort by volume
+            # Filter USDT pairs, parsing each volume only once
             usdt_pairs = []
             for d in data:
                 sym = d['symbol']
@@ -68,73 +213,116 @@ class CryptoDataFetcher:
                 if valid_symbols and sym not in valid_symbols:
                     continue
                     
-                if sym.endswith('USDT') and not sym.startswith('USDC') and float(d['quoteVolume']) > 0:
-                    usdt_pairs.append(d)
+                if not sym.endswith('USDT') or sym.startswith(_STABLE_PREFIXES):
+                    continue
+                
+                volume = float(d['quoteVolume'])
+                if volume > 0:
+                    usdt_pairs.append((volume, sym))
             
-            sorted_pairs = sorted(
-                usdt_pairs, 
-                key=lambda x: float(x['quoteVolume']), 
-                reverse=True
-            )
+            # Partial sort: O(N log k) instead of sorting every pair
+            top_pairs = heapq.nlargest(limit, usdt_pairs, key=itemgetter(0))
             
-            return [p['symbol'] for p in sorted_pairs[:limit]]
+            return [sym for _, sym in top_pairs]
     
     async def get_klines(
         self, 
         symbol: str, 
         interval: str = '4h', 
-        limit: int = 100
-    ) -> List[Dict]:
-        """Get OHLCV data for a symbol"""
-        url = f"{self.BINANCE_API}/klines"
-        params = {
+        limit: int = 100,
+        as_dict: bool = False
+    ) -> Union[np.ndarray, List[Dict]]:
+        """Get OHLCV data for a symbol
+        
+        Returns a KLINE_DTYPE structured array (index columns like
+        `klines['close']`), or a list of dicts when `as_dict=True`.
+        Returns [] on error or when no candles are available.
+        """
+        url = self.KLINES_URL.copy_merge_params({
             'symbol': symbol,
             'interval': interval,
             'limit': limit
-        }
+        })
         
         try:
-            async with self.session.get(url, params=params) as response:
-                if response.status != 200:
+            async with self.session.stream("GET", url) as response:
+                if response.status_code != 200:
                     return []
                 
-                data = await response.json()
+                data = orjson.loads(await response.aread())
+                if not data:
+                    return []
                 
-                return [{
-                    'timestamp': k[0],
-                    'open': float(k[1]),
-                    'high': float(k[2]),
-                    'low': float(k[3]),
-                    'close': float(k[4]),
-                    'volume': float(k[5])
-                } for k in data]
-        except Exception as e:
-            print(f"Error fetching {symbol}: {e}")
+                if as_dict:
+                    return [{
+                        'timestamp': k[0],
+                        'open': float(k[1]),
+                        'high': float(k[2]),
+                        'low': float(k[3]),
+                        'close': float(k[4]),
+                        'volume': float(k[5])
+                    } for k in data]
+                
+                return _parse_klines(data)
+        except _FETCH_ERRORS + (IndexError,) as e:
+            # IndexError: rows shorter than the 6 OHLCV fields
+            logger.warning("Error fetching %s: %s", symbol, e)
             return []
     
-    async def get_ticker_24h(self, symbol: str) -> Optional[Dict]:
-        """Get 24h ticker data"""
-        url = f"{self.BINANCE_API}/ticker/24hr"
-        params = {'symbol': symbol}
+    async def get_ticker_24h(
+        self, 
+        symbol: str, 
+        force_individual: bool = False
+    ) -> Optional[Dict]:
+        """Get 24h ticker data
+        
+        Looked up in the all-tickers index so that N symbols cost one
+        request instead of N. `force_individual=True` queries the
+        single-symbol endpoint instead.
+        """
+        if not force_individual:
+            index = await self.prefetch_tickers()
+            if index:
+                ticker = index.get(symbol)
+                return dict(ticker) if ticker else None
+        # Index unavailable (all-tickers call failed) or explicitly bypassed
+        return await self._fetch_ticker_24h(symbol)
+    
+    async def prefetch_tickers(self) -> Dict[str, Dict]:
+        """Fetch every 24h ticker in one call, indexed by symbol"""
+        # Serialize concurrent lookups so they share a single request
+        async with self._index_lock:
+            index = self._ticker_cache.get(self._TICKER_INDEX_KEY)
+            if index is None:
+                tickers = await self.get_all_tickers()
+                index = {t['symbol']: t for t in tickers}
+                if index:
+                    self._ticker_cache.set(self._TICKER_INDEX_KEY, index)
+            return index
+    
+    @_ttl_cached
+    async def _fetch_ticker_24h(self, symbol: str) -> Optional[Dict]:
+        url = self.TICKER_24H_URL.copy_merge_params({'symbol': symbol})
         
         try:
-            async with self.session.get(url, params=params) as response:
-                if response.status != 200:
+            async with self.session.stream("GET", url) as response:
+                if response.status_code != 200:
                     return None
-                return await response.json()
-        except:
+                return orjson.loads(await response.aread())
+        except _FETCH_ERRORS as e:
+            logger.warning("Error fetching ticker %s: %s", symbol, e)
             return None
     
+    @_ttl_cached
     async def get_all_tickers(self) -> List[Dict]:
         """Get all ticker prices"""
-        url = f"{self.BINANCE_API}/ticker/24hr"
-        
         try:
-            async with self.session.get(url) as response:
-                if response.status != 200:
+            async with self.session.stream("GET", self.TICKER_24H_URL) as response:
+                if response.status_code != 200:
                     return []
-                return await response.json()
-        except:
+                return orjson.loads(await response.aread())
+        except _FETCH_ERRORS as e:
+            logger.warning("Error fetching tickers: %s", e)
             return []
 
     async def fetch_multi_timeframe_data(
@@ -142,14 +330,21 @@ class CryptoDataFetcher:
         symbol: str,
         timeframes: List[str] = ['15m', '1h', '4h', '12h', '1d']
     ) -> Dict:
-        """Fetch data for multiple timeframes"""
+        """Fetch data for multiple timeframes concurrently"""
+        if not timeframes:
+            return {}
+        
         tasks = [
             self.get_klines(symbol, tf, limit=100) 
             for tf in timeframes
         ]
-        results = await asyncio.gather(*tasks)
+        # One failing timeframe must not cancel the others
+        results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        return {
-            tf: data 
-            for tf, data in zip(timeframes, results)
-        }
+        multi_tf_data = {}
+        for tf, data in zip(timeframes, results):
+            # Cancellation and interpreter exits (non-Exception) still propagate
+            if isinstance(data, BaseException) and not isinstance(data, Exception):
+                raise data
+            multi_tf_data[tf] = [] if isinstance(data, Exception) else data
+        return multi_tf_data
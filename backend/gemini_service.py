@@ -8,6 +8,7 @@ from typing import Dict, List, Optional
 from pathlib import Path
 import json
 import os
+import re
 
 # Path untuk menyimpan konfigurasi
 CONFIG_DIR = Path(__file__).parent
@@ -46,6 +47,31 @@ AVAILABLE_MODELS = {
 
 DEFAULT_MODEL = "gemini-2.5-flash"
 
+# API error categories, matched against the exception message in priority order
+_ERROR_PATTERNS = {
+    "invalid_api_key": re.compile(r"api_key|invalid|401", re.IGNORECASE),
+    "rate_limit": re.compile(r"quota|rate|429", re.IGNORECASE),
+    "model_not_found": re.compile(r"not found|404", re.IGNORECASE),
+}
+
+# Chat responses also recognise the SDK's longer wordings and permission errors
+_CHAT_ERROR_PATTERNS = {
+    "invalid_api_key": re.compile(r"api_key|invalid|401|api key not valid", re.IGNORECASE),
+    "rate_limit": re.compile(r"quota|rate|429|resource", re.IGNORECASE),
+    "model_not_found": _ERROR_PATTERNS["model_not_found"],
+    "permission_denied": re.compile(r"permission|403", re.IGNORECASE),
+}
+
+
+def _classify_error(error_msg: str, patterns: Optional[Dict[str, re.Pattern]] = None) -> Optional[str]:
+    """Return the first error category in `patterns` (default _ERROR_PATTERNS) matching the message"""
+    if patterns is None:
+        patterns = _ERROR_PATTERNS
+    for label, pattern in patterns.items():
+        if pattern.search(error_msg):
+            return label
+    return None
+
 
 def get_api_key() -> Optional[str]:
     """Read API key from file or environment variable
@@ -153,7 +179,7 @@ def get_available_models() -> Dict:
     return AVAILABLE_MODELS
 
 
-def validate_api_key(api_key: str, model: str = None) -> Dict:
+async def validate_api_key(api_key: str, model: str = None) -> Dict:
     """Validate API key by trying a simple request"""
     if model is None:
         model = get_selected_model()
@@ -161,21 +187,14 @@ def validate_api_key(api_key: str, model: str = None) -> Dict:
     try:
         genai.configure(api_key=api_key)
         test_model = genai.GenerativeModel(model)
-        # Test dengan prompt minimal
-        response = test_model.generate_content("Hi")
+        # Test dengan prompt minimal (async so the event loop isn't blocked)
+        response = await test_model.generate_content_async("Hi")
         if response.text:
             return {"valid": True, "error": None}
         return {"valid": False, "error": "empty_response"}
     except Exception as e:
-        error_msg = str(e).lower()
-        if "api_key" in error_msg or "invalid" in error_msg or "401" in error_msg:
-            return {"valid": False, "error": "invalid_api_key"}
-        elif "quota" in error_msg or "rate" in error_msg or "429" in error_msg:
-            return {"valid": False, "error": "rate_limit"}
-        elif "not found" in error_msg or "404" in error_msg:
-            return {"valid": False, "error": "model_not_found"}
-        else:
-            return {"valid": False, "error": str(e)}
+        error = _classify_error(str(e))
+        return {"valid": False, "error": error or str(e)}
 
 
 class GeminiService:
@@ -332,8 +351,8 @@ Answer the user's question based on the data above."""
             # Combine system prompt with user message for first message
             full_prompt = f"{system_prompt}\n\nPertanyaan User: {user_message}"
 
-            # Generate response
-            response = chat.send_message(full_prompt)
+            # Generate response without blocking the event loop
+            response = await chat.send_message_async(full_prompt)
 
             return {
                 "success": True,
@@ -342,40 +361,27 @@ Answer the user's question based on the data above."""
             }
 
         except Exception as e:
-            error_msg = str(e).lower()
-
             # Handle specific errors with clear messages
-            if "api_key" in error_msg or "invalid" in error_msg or "401" in error_msg or "api key not valid" in error_msg:
-                return {
-                    "success": False,
-                    "response": "Invalid API key. Please check and enter the correct API key in settings.",
-                    "error": "invalid_api_key"
-                }
-            elif "quota" in error_msg or "rate" in error_msg or "429" in error_msg or "resource" in error_msg:
-                return {
-                    "success": False,
-                    "response": "API usage limit reached. Gemini free tier has a limit of 15 requests/minute. Please wait and try again.",
-                    "error": "rate_limit"
-                }
-            elif "not found" in error_msg or "404" in error_msg:
-                return {
-                    "success": False,
-                    "response": f"Model '{self.model_name}' not found or not available. Try selecting a different model in settings.",
-                    "error": "model_not_found"
-                }
-            elif "permission" in error_msg or "403" in error_msg:
-                return {
-                    "success": False,
-                    "response": "API key does not have permission to access Gemini. Make sure the API key is activated.",
-                    "error": "permission_denied"
-                }
-            else:
+            error = _classify_error(str(e), _CHAT_ERROR_PATTERNS)
+            if error is None:
                 return {
                     "success": False,
                     "response": f"An error occurred: {str(e)}",
                     "error": "unknown"
                 }
 
+            responses = {
+                "invalid_api_key": "Invalid API key. Please check and enter the correct API key in settings.",
+                "rate_limit": "API usage limit reached. Gemini free tier has a limit of 15 requests/minute. Please wait and try again.",
+                "model_not_found": f"Model '{self.model_name}' not found or not available. Try selecting a different model in settings.",
+                "permission_denied": "API key does not have permission to access Gemini. Make sure the API key is activated.",
+            }
+            return {
+                "success": False,
+                "response": responses[error],
+                "error": error
+            }
+
     def get_market_summary(self, market_data: Dict) -> Dict:
         """Generate market summary from heatmap data"""
 
@@ -446,7 +452,7 @@ Timeframe context: {timeframe}
 IMPORTANT: End with a disclaimer that this is not financial advice."""
 
             # Generate response using Gemini 3 Flash
-            response = fundamental_model.generate_content(system_prompt)
+            response = await fundamental_model.generate_content_async(system_prompt)
 
             return {
                 "success": True,
@@ -455,29 +461,21 @@ IMPORTANT: End with a disclaimer that this is not financial advice."""
             }
 
         except Exception as e:
-            error_msg = str(e).lower()
-
-            if "api_key" in error_msg or "invalid" in error_msg or "401" in error_msg:
-                return {
-                    "success": False,
-                    "response": "Invalid API key. Please check and enter the correct API key in settings.",
-                    "error": "invalid_api_key"
-                }
-            elif "quota" in error_msg or "rate" in error_msg or "429" in error_msg:
-                return {
-                    "success": False,
-                    "response": "API usage limit reached. Please wait and try again.",
-                    "error": "rate_limit"
-                }
-            elif "not found" in error_msg or "404" in error_msg:
-                return {
-                    "success": False,
-                    "response": f"Model '{FUNDAMENTAL_MODEL}' not found. This may be a preview model not available in your region.",
-                    "error": "model_not_found"
-                }
-            else:
+            error = _classify_error(str(e))
+            if error is None:
                 return {
                     "success": False,
                     "response": f"An error occurred: {str(e)}",
                     "error": "unknown"
                 }
+
+            responses = {
+                "invalid_api_key": "Invalid API key. Please check and enter the correct API key in settings.",
+                "rate_limit": "API usage limit reached. Please wait and try again.",
+                "model_not_found": f"Model '{FUNDAMENTAL_MODEL}' not found. This may be a preview model not available in your region.",
+            }
+            return {
+                "success": False,
+                "response": responses[error],
+                "error": error
+            }
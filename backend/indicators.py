@@ -1,74 +1,253 @@
+from bisect import bisect_right
+
 import numpy as np
-import pandas as pd
-from typing import List, Dict, Tuple, Optional, Union
+from typing import List, Dict, Tuple, Optional, Sequence, Union
+
+def _ewm(values: List[float], alpha: float) -> List[float]:
+    """
+    Single-pass exponential smoothing, equivalent to pandas
+    `ewm(alpha=alpha, adjust=False).mean()`.
+    Leading NaNs stay NaN; the first valid value seeds the average. Later
+    NaNs repeat the last average and, as in pandas (ignore_na=False), decay
+    its weight for the next valid value.
+    """
+    beta = 1.0 - alpha
+    out = [np.nan] * len(values)
+    avg = np.nan
+    # Weight of the running average; 1 right after a valid value
+    old_wt = 1.0
+    for i, x in enumerate(values):
+        if avg != avg:
+            avg = x
+        else:
+            old_wt *= beta
+            if x == x:
+                if avg != x:
+                    avg = (old_wt * avg + alpha * x) / (old_wt + alpha)
+                old_wt = 1.0
+        out[i] = avg
+    return out
+
+def _ewm_pair(values: List[float], alpha1: float, alpha2: float) -> Tuple[List[float], List[float]]:
+    """
+    Two `_ewm` passes with different alphas, fused into one loop over `values`.
+    `values` must not contain NaNs.
+    """
+    beta1 = 1.0 - alpha1
+    beta2 = 1.0 - alpha2
+    denom1 = beta1 + alpha1
+    denom2 = beta2 + alpha2
+    out1 = [np.nan] * len(values)
+    out2 = [np.nan] * len(values)
+    if not values:
+        return out1, out2
+
+    avg1 = avg2 = values[0]
+    for i, x in enumerate(values):
+        if avg1 != x:
+            avg1 = (beta1 * avg1 + alpha1 * x) / denom1
+        if avg2 != x:
+            avg2 = (beta2 * avg2 + alpha2 * x) / denom2
+        out1[i] = avg1
+        out2[i] = avg2
+    return out1, out2
 
 def calculate_ema(prices: List[float], period: int) -> List[float]:
     """Calculate Exponential Moving Average"""
     if len(prices) < period:
         return [np.nan] * len(prices)
-    
-    df = pd.DataFrame({'close': prices})
-    ema = df['close'].ewm(span=period, adjust=False).mean()
-    return ema.tolist()
 
-def calculate_rma(series: pd.Series, period: int) -> pd.Series:
+    return _ewm(np.asarray(prices, dtype=np.float64).tolist(), 2.0 / (period + 1))
+
+def calculate_ema_pair(prices: List[float], period1: int, period2: int) -> Tuple[List[float], List[float]]:
+    """
+    Calculate two EMAs of the same prices in one pass.
+    Same results as `calculate_ema(prices, period1), calculate_ema(prices, period2)`.
+    """
+    n = len(prices)
+    if n < period1 and n < period2:
+        return [np.nan] * n, [np.nan] * n
+
+    arr = np.asarray(prices, dtype=np.float64)
+    alpha1, alpha2 = 2.0 / (period1 + 1), 2.0 / (period2 + 1)
+    values = arr.tolist()
+    if np.isnan(arr).any():
+        # The fused loop assumes NaN-free prices
+        ema1, ema2 = _ewm(values, alpha1), _ewm(values, alpha2)
+    else:
+        ema1, ema2 = _ewm_pair(values, alpha1, alpha2)
+    if n < period1:
+        ema1 = [np.nan] * n
+    if n < period2:
+        ema2 = [np.nan] * n
+    return ema1, ema2
+
+def calculate_rma(values: Sequence[float], period: int) -> List[float]:
     """
     Calculate RMA (Relative Moving Average) / Wilder's Smoothing / SMMA
+    Accepts any float sequence (list, ndarray, Series)
     """
-    alpha = 1.0 / period
-    return series.ewm(alpha=alpha, adjust=False).mean()
+    return _ewm(np.asarray(values, dtype=np.float64).tolist(), 1.0 / period)
 
 def calculate_rsi(prices: List[float], period: int = 14) -> List[float]:
     """
     Calculate RSI (Relative Strength Index) using Wilder's Smoothing (RMA)
     """
-    if len(prices) < period + 1:
-        return [np.nan] * len(prices)
+    arr = np.asarray(prices, dtype=np.float64)
+    n = len(arr)
+    if n < period + 1:
+        return [np.nan] * n
 
-    df = pd.DataFrame({'close': prices})
-    change = df['close'].diff()
-    gain = change.where(change > 0, 0.0)
-    loss = (-change).where(change < 0, 0.0)
+    # Split the bar-to-bar changes into gains and losses in one NumPy pass;
+    # only the smoothing recurrence below stays a Python loop
+    change = np.diff(arr)
+    gains = np.where(change > 0, change, 0.0).tolist()
+    losses = np.where(change < 0, -change, 0.0).tolist()
 
-    avg_gain = calculate_rma(gain, period)
-    avg_loss = calculate_rma(loss, period)
+    alpha = 1.0 / period
+    beta = 1.0 - alpha
+    denom = beta + alpha
 
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
+    rsi = [np.nan] * n
+    # The first bar has no change, so both averages are seeded with 0
+    avg_gain = avg_loss = 0.0
+    for i, (gain, loss) in enumerate(zip(gains, losses), 1):
+        if avg_gain != gain:
+            avg_gain = (beta * avg_gain + alpha * gain) / denom
+        if avg_loss != loss:
+            avg_loss = (beta * avg_loss + alpha * loss) / denom
 
-    rsi = rsi.where(avg_loss != 0, 100.0)
-    rsi = rsi.where(avg_gain != 0, rsi)
-    rsi = rsi.where((avg_gain != 0) | (avg_loss != 0), 50.0)
-    rsi.iloc[:period] = np.nan
+        if i < period:
+            continue
+        if avg_loss != 0:
+            rsi[i] = 100 - (100 / (1 + avg_gain / avg_loss))
+        elif avg_gain != 0:
+            rsi[i] = 100.0
+        else:
+            rsi[i] = 50.0
 
-    return rsi.tolist()
+    return rsi
+
+def smooth_rsi(rsi_values: List[float], smooth_period: int = 9) -> List[float]:
+    """
+    EMA-smooth an RSI series from calculate_rsi, so callers that already
+    have the RSI don't compute it twice
+    """
+    return _ewm(rsi_values, 2.0 / (smooth_period + 1))
 
 def calculate_smoothed_rsi(prices: List[float], rsi_period: int = 14, smooth_period: int = 9) -> List[float]:
     """
     Calculate Smoothed RSI (RSI with EMA smoothing)
     """
-    rsi_values = calculate_rsi(prices, rsi_period)
-    df = pd.DataFrame({'rsi': rsi_values})
-    smoothed = df['rsi'].ewm(span=smooth_period, adjust=False).mean()
-    return smoothed.tolist()
+    return smooth_rsi(calculate_rsi(prices, rsi_period), smooth_period)
 
 def calculate_atr(high: List[float], low: List[float], close: List[float], period: int = 14) -> List[float]:
     """Calculate ATR (Average True Range) using RMA"""
     if len(close) < period:
         return [np.nan] * len(close)
-    
-    df = pd.DataFrame({'high': high, 'low': low, 'close': close})
-    df['prev_close'] = df['close'].shift(1)
-    
-    # TR = max(high-low, abs(high-prev_close), abs(low-prev_close))
-    df['tr0'] = df['high'] - df['low']
-    df['tr1'] = (df['high'] - df['prev_close']).abs()
-    df['tr2'] = (df['low'] - df['prev_close']).abs()
-    df['tr'] = df[['tr0', 'tr1', 'tr2']].max(axis=1)
-    
+
+    h = np.asarray(high, dtype=np.float64)
+    lo = np.asarray(low, dtype=np.float64)
+    prev_close = np.empty(len(close))
+    prev_close[0] = np.nan
+    prev_close[1:] = np.asarray(close, dtype=np.float64)[:-1]
+
+    # TR = max(high-low, abs(high-prev_close), abs(low-prev_close)), skipping
+    # NaN terms like pandas' max(axis=1); the first bar has no previous
+    # close, so its TR is high-low
+    tr = np.fmax(np.fmax(h - lo, np.abs(h - prev_close)), np.abs(lo - prev_close))
+
     # ATR = RMA(TR)
-    atr = calculate_rma(df['tr'], period)
-    return atr.tolist()
+    return _ewm(tr.tolist(), 1.0 / period)
+
+class EMAState:
+    """
+    Incremental EMA: `update(price)` returns the value calculate_ema would
+    give for the series seen so far, in O(1) per price. Prices must not be NaN.
+    """
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.beta = 1.0 - self.alpha
+        self.denom = self.beta + self.alpha
+        self.count = 0
+        self.value = np.nan
+
+    def update(self, price: float) -> float:
+        price = float(price)
+        self.count += 1
+        if self.count == 1:
+            self.value = price
+        elif self.value != price:
+            self.value = (self.beta * self.value + self.alpha * price) / self.denom
+        return self.value if self.count >= self.period else np.nan
+
+class RSIState:
+    """
+    Incremental RSI: `update(price)` returns the value calculate_rsi would
+    give for the latest price, in O(1) per price. Prices must not be NaN.
+    """
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.alpha = 1.0 / period
+        self.beta = 1.0 - self.alpha
+        self.denom = self.beta + self.alpha
+        self.count = 0
+        self.prev_close = np.nan
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, price: float) -> float:
+        price = float(price)
+        self.count += 1
+        if self.count == 1:
+            self.prev_close = price
+            return np.nan
+
+        change = price - self.prev_close
+        self.prev_close = price
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        if self.avg_gain != gain:
+            self.avg_gain = (self.beta * self.avg_gain + self.alpha * gain) / self.denom
+        if self.avg_loss != loss:
+            self.avg_loss = (self.beta * self.avg_loss + self.alpha * loss) / self.denom
+
+        if self.count <= self.period:
+            return np.nan
+        if self.avg_loss != 0:
+            return 100 - (100 / (1 + self.avg_gain / self.avg_loss))
+        if self.avg_gain != 0:
+            return 100.0
+        return 50.0
+
+def _is_pivot_low(arr, i: int, left: int, right: int, length: int) -> bool:
+    """True if arr[i] is strictly below its `left`/`right` neighbours within arr[:length]."""
+    val = arr[i]
+    # Check left
+    for k in range(1, left + 1):
+        if i - k < 0: return False
+        if arr[i - k] <= val: return False
+    # Check right
+    for k in range(1, right + 1):
+        if i + k >= length: return False
+        if arr[i + k] <= val: return False
+    return True
+
+def _is_pivot_high(arr, i: int, left: int, right: int, length: int) -> bool:
+    """True if arr[i] is strictly above its `left`/`right` neighbours within arr[:length]."""
+    val = arr[i]
+    # Check left
+    for k in range(1, left + 1):
+        if i - k < 0: return False
+        if arr[i - k] >= val: return False
+    # Check right
+    for k in range(1, right + 1):
+        if i + k >= length: return False
+        if arr[i + k] >= val: return False
+    return True
 
 def check_divergence(
     high: List[float],
@@ -78,15 +257,18 @@ def check_divergence(
     lookback_left: int = 5,
     lookback_right: int = 5,
     range_lower: int = 5,
-    range_upper: int = 60
+    range_upper: int = 60,
+    end: Optional[int] = None
 ) -> Optional[str]:
     """
     Checks for Regular Bullish/Bearish Divergence based on Pivot logic.
     Implements logic from newCompro/src/indicators.py.
+    `end` evaluates the series as if it stopped there (like slicing `[:end]`)
+    without copying it.
     """
     # Create DF-like structure for easy indexing (simulating what newCompro does)
     # We assume inputs are lists/arrays of same length
-    length = len(close)
+    length = len(close) if end is None else end
     if length < range_upper + lookback_left + lookback_right + 5:
         return None
     
@@ -97,33 +279,14 @@ def check_divergence(
     if pivot_idx < range_upper:
         return None
 
-    # Helper functions (using list indexing)
-    def is_pivot_low(arr, i, left, right):
-        val = arr[i]
-        # Check left
-        for k in range(1, left + 1):
-            if i - k < 0: return False
-            if arr[i - k] <= val: return False
-        # Check right
-        for k in range(1, right + 1):
-            if i + k >= len(arr): return False
-            if arr[i + k] <= val: return False
-        return True
-
-    def is_pivot_high(arr, i, left, right):
-        val = arr[i]
-        # Check left
-        for k in range(1, left + 1):
-            if i - k < 0: return False
-            if arr[i - k] >= val: return False
-        # Check right
-        for k in range(1, right + 1):
-            if i + k >= len(arr): return False
-            if arr[i + k] >= val: return False
-        return True
+    # Pivots are tested lazily, only at the confirmed bar and then backwards
+    # until the previous pivot, so this touches a few dozen values; converting
+    # the series to NumPy to find every extremum up front costs more than the
+    # whole scan. A bar can pass both pivot tests (zero lookbacks, or a NaN
+    # RSI), so the bearish search still runs when the bullish one finds nothing.
 
     # --- CHECK BULLISH DIVERGENCE (Pivot Low) ---
-    if is_pivot_low(rsi, pivot_idx, lookback_left, lookback_right):
+    if _is_pivot_low(rsi, pivot_idx, lookback_left, lookback_right, length):
         current_pivot_rsi = rsi[pivot_idx]
         current_pivot_low_price = low[pivot_idx]
         
@@ -133,7 +296,7 @@ def check_divergence(
             if prev_idx < lookback_left:
                 break
                 
-            if is_pivot_low(rsi, prev_idx, lookback_left, lookback_right):
+            if _is_pivot_low(rsi, prev_idx, lookback_left, lookback_right, length):
                 prev_pivot_rsi = rsi[prev_idx]
                 prev_pivot_low_price = low[prev_idx]
                 
@@ -143,7 +306,7 @@ def check_divergence(
                 break
 
     # --- CHECK BEARISH DIVERGENCE (Pivot High) ---
-    if is_pivot_high(rsi, pivot_idx, lookback_left, lookback_right):
+    if _is_pivot_high(rsi, pivot_idx, lookback_left, lookback_right, length):
         current_pivot_rsi = rsi[pivot_idx]
         current_pivot_high_price = high[pivot_idx]
         
@@ -152,7 +315,7 @@ def check_divergence(
             if prev_idx < lookback_left:
                 break
             
-            if is_pivot_high(rsi, prev_idx, lookback_left, lookback_right):
+            if _is_pivot_high(rsi, prev_idx, lookback_left, lookback_right, length):
                 prev_pivot_rsi = rsi[prev_idx]
                 prev_pivot_high_price = high[prev_idx]
                 
@@ -191,6 +354,9 @@ def detect_signal_layer(
     idx = -2
     
     # --- Data at Closed Candle ---
+    # The series stay float64: float32 keeps ~7 significant digits, which
+    # moves a 60k BTC EMA by ~0.004 and can flip the ATR touch/spread
+    # comparisons below; main.py also serves the EMAs rounded to 8 places
     c_price = close[idx]
     c_ema13 = ema_13[idx]
     c_ema21 = ema_21[idx]
@@ -223,9 +389,9 @@ def detect_signal_layer(
     
     # --- Divergence Check ---
     # Check divergence on the closed series (excluding active candle at -1)
-    # We pass the lists sliced up to -1
+    # `end` stops the scan before it without copying the series
     div_status = check_divergence(
-        high[:-1], low[:-1], close[:-1], rsi_14[:-1]
+        high, low, close, rsi_14, end=len(close) - 1
     )
     
     has_bullish_div = div_status == 'bullish_regular'
@@ -297,17 +463,21 @@ def detect_signal_layer(
         
     return result
 
+# Lower bounds of each RSI category above OVERSOLD; a value equal to a
+# bound belongs to the higher category
+_RSI_THRESHOLDS = (30, 40, 60, 70)
+_RSI_CATEGORIES = ('OVERSOLD', 'WEAK', 'NEUTRAL', 'STRONG', 'OVERBOUGHT')
+_RSI_CATEGORY_LABELS = np.array(_RSI_CATEGORIES)
+
 def get_rsi_category(rsi: float) -> str:
     """Categorize RSI value"""
-    if pd.isna(rsi):
-        return 'NEUTRAL'
-    if rsi >= 70:
-        return 'OVERBOUGHT'
-    elif rsi >= 60:
-        return 'STRONG'
-    elif rsi >= 40:
+    if rsi is None or rsi != rsi:
         return 'NEUTRAL'
-    elif rsi >= 30:
-        return 'WEAK'
-    else:
-        return 'OVERSOLD'
\ No newline at end of file
+    return _RSI_CATEGORIES[bisect_right(_RSI_THRESHOLDS, rsi)]
+
+def get_rsi_categories(rsi_values: Sequence[float]) -> np.ndarray:
+    """Categorize a whole series of RSI values; same rules as get_rsi_category"""
+    values = np.asarray(rsi_values, dtype=np.float64)
+    categories = _RSI_CATEGORY_LABELS[np.digitize(values, _RSI_THRESHOLDS)]
+    categories[np.isnan(values)] = 'NEUTRAL'
+    return categories
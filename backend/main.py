@@ -1,22 +1,21 @@
 from fastapi import FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import ORJSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-import aiohttp
 import asyncio
 import ssl
 import os
-import json
+import orjson
 from datetime import datetime
 from typing import List, Dict, Optional
 
 from data_fetcher import CryptoDataFetcher
 from cache_manager import CacheManager
 from indicators import (
-    calculate_ema,
+    calculate_ema_pair,
     calculate_rsi,
-    calculate_smoothed_rsi,
+    smooth_rsi,
     calculate_atr,
     detect_signal_layer
 )
@@ -59,7 +58,8 @@ class FundamentalRequest(BaseModel):
     timeframe: str = "4h"
 
 
-app = FastAPI(title="Crypto EMA + RSI Heatmap API")
+# orjson serializes the large heatmap payloads several times faster than json
+app = FastAPI(title="Crypto EMA + RSI Heatmap API", default_response_class=ORJSONResponse)
 cache_manager = CacheManager()
 
 # Initialize Gemini Service (lazy loading to handle missing API key gracefully)
@@ -69,6 +69,11 @@ try:
 except Exception as e:
     print(f"Warning: Gemini service not initialized: {e}")
 
+@app.on_event("shutdown")
+async def close_http_session():
+    await CryptoDataFetcher.close_shared_session()
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -96,7 +101,7 @@ async def get_heatmap(
     cached_data = cache_manager.get_cache(limit, timeframe)
     if cached_data:
         # Add cache header to response
-        return JSONResponse(content=cached_data, headers={"X-Cache": "HIT"})
+        return ORJSONResponse(content=cached_data, headers={"X-Cache": "HIT"})
 
     try:
         fetcher = CryptoDataFetcher()
@@ -105,7 +110,7 @@ async def get_heatmap(
             top_symbols = await fetcher.get_top_symbols(limit=limit)
             
             if not top_symbols:
-                 return JSONResponse({
+                 return ORJSONResponse({
                     'success': False, 
                     'error': 'Failed to fetch symbols from Binance',
                     'timeframe': timeframe,
@@ -124,14 +129,14 @@ async def get_heatmap(
         
         # 3. Process each symbol
         for symbol, klines in zip(top_symbols, all_klines):
-            if not klines or len(klines) < 50:
+            if len(klines) < 50:
                 continue
                 
-            # Extract prices
-            close_prices = [k['close'] for k in klines]
-            high_prices = [k['high'] for k in klines]
-            low_prices = [k['low'] for k in klines]
-            current_price = close_prices[-1]
+            # Extract prices (column views of the structured array)
+            close_prices = klines['close']
+            high_prices = klines['high']
+            low_prices = klines['low']
+            current_price = float(close_prices[-1])
             
             # Extract 24h change (approximate from candles or we need a separate call, 
             # simplest is to use percentage change from 24h ago in the klines if interval allows,
@@ -155,9 +160,8 @@ async def get_heatmap(
             
             # Let's proceed with calculating indicators
             rsi_series = calculate_rsi(close_prices)
-            rsi_smoothed_series = calculate_smoothed_rsi(close_prices)
-            ema_13_series = calculate_ema(close_prices, 13)
-            ema_21_series = calculate_ema(close_prices, 21)
+            rsi_smoothed_series = smooth_rsi(rsi_series)
+            ema_13_series, ema_21_series = calculate_ema_pair(close_prices, 13, 21)
             atr_series = calculate_atr(high_prices, low_prices, close_prices)
             
             # Get latest values
@@ -173,7 +177,7 @@ async def get_heatmap(
             # For now, I'll use the last candle's change as a placeholder for 'price_change_24h' 
             # effectively treating it as "period change".
             # Or simplified: (current - open_of_last_candle) / open * 100
-            price_change_fake_24h = ((current_price - klines[0]['close']) / klines[0]['close'] * 100) # Change over loaded period
+            price_change_fake_24h = ((current_price - close_prices[0]) / close_prices[0] * 100) # Change over loaded period
             
             layer_info = detect_signal_layer(
                 high_prices,
@@ -222,11 +226,11 @@ async def get_heatmap(
         # Save to Cache
         cache_manager.set_cache(limit, timeframe, response_data, ttl_seconds=ttl)
         
-        return JSONResponse(content=response_data, headers={"X-Cache": "MISS"})
+        return ORJSONResponse(content=response_data, headers={"X-Cache": "MISS"})
         
     except Exception as e:
         print(f"Error: {e}")
-        return JSONResponse({
+        return ORJSONResponse({
             'success': False, 
             'error': str(e),
             'timeframe': timeframe,
@@ -238,12 +242,10 @@ async def get_heatmap(
 async def get_stats(timeframe: str = Query(default="4h")):
     """Get signal statistics"""
     heatmap_response = await get_heatmap(limit=200, timeframe=timeframe)
-    data = heatmap_response.body.decode()
-    import json
-    result = json.loads(data)
+    result = orjson.loads(heatmap_response.body)
     
     if not result.get('success'):
-        return JSONResponse(result)
+        return ORJSONResponse(result)
     
     signals = result.get('signals', [])
     
@@ -256,7 +258,7 @@ async def get_stats(timeframe: str = Query(default="4h")):
         if s['short_layer'] > 0:
             short_layers[s['short_layer']] += 1
     
-    return JSONResponse({
+    return ORJSONResponse({
         'success': True,
         'timeframe': timeframe,
         'total_coins': len(signals),
@@ -315,13 +317,13 @@ async def set_apikey(request: ApiKeyRequest):
     api_key = request.api_key.strip()
 
     if not api_key:
-        return JSONResponse(
+        return ORJSONResponse(
             content={"success": False, "error": "API key cannot be empty"},
             status_code=400
         )
 
     # Validate API key
-    validation = validate_api_key(api_key)
+    validation = await validate_api_key(api_key)
 
     if not validation["valid"]:
         error_messages = {
@@ -334,7 +336,7 @@ async def set_apikey(request: ApiKeyRequest):
         if validation["error"] == "rate_limit":
             save_api_key(api_key)
             gemini_service = GeminiService()
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "success": True,
                     "message": "API key saved. Rate limit reached, try chatting later.",
@@ -342,7 +344,7 @@ async def set_apikey(request: ApiKeyRequest):
                 }
             )
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={"success": False, "error": error_msg},
             status_code=400
         )
@@ -351,11 +353,11 @@ async def set_apikey(request: ApiKeyRequest):
     if save_api_key(api_key):
         # Reload gemini service
         gemini_service = GeminiService()
-        return JSONResponse(
+        return ORJSONResponse(
             content={"success": True, "message": "API key saved and validated successfully!"}
         )
     else:
-        return JSONResponse(
+        return ORJSONResponse(
             content={"success": False, "error": "Failed to save API key"},
             status_code=500
         )
@@ -371,12 +373,12 @@ async def delete_apikey():
             gemini_service = GeminiService()
             return {"success": True, "message": "API key deleted successfully"}
         else:
-            return JSONResponse(
+            return ORJSONResponse(
                 content={"success": False, "error": "Failed to delete API key"},
                 status_code=500
             )
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             content={"success": False, "error": str(e)},
             status_code=500
         )
@@ -402,7 +404,7 @@ async def set_model(request: ModelRequest):
     model = request.model
 
     if model not in get_available_models():
-        return JSONResponse(
+        return ORJSONResponse(
             content={"success": False, "error": f"Model '{model}' is not available"},
             status_code=400
         )
@@ -416,7 +418,7 @@ async def set_model(request: ModelRequest):
             "current_model": model
         }
     else:
-        return JSONResponse(
+        return ORJSONResponse(
             content={"success": False, "error": "Failed to save model"},
             status_code=500
         )
@@ -433,7 +435,7 @@ async def chat_with_ai(request: ChatRequest):
 
     # Check if Gemini service is available
     if gemini_service is None or not gemini_service.is_configured():
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "success": False,
                 "response": "API key not configured. Click the Settings button to enter your Gemini API key.",
@@ -446,10 +448,10 @@ async def chat_with_ai(request: ChatRequest):
     try:
         # 1. Fetch current heatmap data
         heatmap_response = await get_heatmap(limit=100, timeframe=request.timeframe)
-        heatmap_data = json.loads(heatmap_response.body.decode())
+        heatmap_data = orjson.loads(heatmap_response.body)
 
         if not heatmap_data.get('success'):
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "success": False,
                     "response": "Failed to fetch market data. Please try again later.",
@@ -475,7 +477,7 @@ async def chat_with_ai(request: ChatRequest):
         # 4. Get market summary
         market_summary = gemini_service.get_market_summary(heatmap_data)
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "success": result["success"],
                 "response": result["response"],
@@ -486,7 +488,7 @@ async def chat_with_ai(request: ChatRequest):
 
     except Exception as e:
         print(f"Chat error: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "success": False,
                 "response": f"An error occurred: {str(e)}",
@@ -508,7 +510,7 @@ async def get_fundamental_analysis(request: FundamentalRequest):
 
     # Check if Gemini service is available
     if gemini_service is None or not gemini_service.is_configured():
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "success": False,
                 "response": "API key not configured. Click the Settings button in AI Chat to enter your Gemini API key.",
@@ -524,7 +526,7 @@ async def get_fundamental_analysis(request: FundamentalRequest):
             timeframe=request.timeframe
         )
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "success": result["success"],
                 "response": result["response"],
@@ -534,7 +536,7 @@ async def get_fundamental_analysis(request: FundamentalRequest):
 
     except Exception as e:
         print(f"Fundamental analysis error: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "success": False,
                 "response": f"An error occurred: {str(e)}",
@@ -562,4 +564,5 @@ if os.path.exists(FRONTEND_DIST):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # loop="auto" uses uvloop when installed, plain asyncio otherwise (Windows)
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="auto")
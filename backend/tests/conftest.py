@@ -6,49 +6,91 @@ Fixtures provide reusable test setup/teardown and mock configurations.
 """
 import pytest
 import json
+import numpy as np
+import orjson
 import os
 import sys
 import tempfile
 from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 
-# Add backend directory to path for imports
-sys.path.insert(0, str(Path(__file__).parent.parent))
+# Every test mocks `gemini_service.genai`, so stub the SDK before anything
+# imports it; the real package pulls in protobuf/grpc at collection time
+sys.modules.setdefault('google.generativeai', MagicMock())
 
 
 # ============================================================================
 # Sample Data Fixtures
 # ============================================================================
 
+# Realistic price movement pattern
+SAMPLE_PRICES = (
+    100.0, 101.5, 102.3, 101.8, 103.2, 104.5, 103.9, 105.1, 106.2, 105.8,
+    107.0, 108.3, 107.5, 109.1, 110.2, 109.8, 111.0, 112.5, 111.9, 113.2,
+    114.5, 113.8, 115.1, 116.3, 115.7, 117.0, 118.2, 117.6, 119.0, 120.3,
+    119.5, 121.0, 122.4, 121.8, 123.1, 124.5, 123.9, 125.2, 126.4, 125.8,
+    127.0, 128.3, 127.5, 129.0, 130.2, 129.6, 131.0, 132.3, 131.7, 133.0,
+)
+
+
 @pytest.fixture
 def sample_prices():
     """Generate sample price data for indicator testing."""
-    # Realistic price movement pattern
-    return [
-        100.0, 101.5, 102.3, 101.8, 103.2, 104.5, 103.9, 105.1, 106.2, 105.8,
-        107.0, 108.3, 107.5, 109.1, 110.2, 109.8, 111.0, 112.5, 111.9, 113.2,
-        114.5, 113.8, 115.1, 116.3, 115.7, 117.0, 118.2, 117.6, 119.0, 120.3,
-        119.5, 121.0, 122.4, 121.8, 123.1, 124.5, 123.9, 125.2, 126.4, 125.8,
-        127.0, 128.3, 127.5, 129.0, 130.2, 129.6, 131.0, 132.3, 131.7, 133.0,
-    ]
+    return list(SAMPLE_PRICES)
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
+def sample_indicators():
+    """Indicator bundle for SAMPLE_PRICES, computed once per session.
+
+    High/low are close +/- 1%. Every series is a tuple so tests sharing the
+    bundle cannot mutate it.
+    """
+    from indicators import (
+        calculate_ema, calculate_rsi, calculate_smoothed_rsi, calculate_atr
+    )
+
+    close = list(SAMPLE_PRICES)
+    high = [p * 1.01 for p in close]
+    low = [p * 0.99 for p in close]
+    return SimpleNamespace(
+        high=tuple(high),
+        low=tuple(low),
+        close=SAMPLE_PRICES,
+        ema13=tuple(calculate_ema(close, 13)),
+        ema21=tuple(calculate_ema(close, 21)),
+        rsi14=tuple(calculate_rsi(close, 14)),
+        srsi=tuple(calculate_smoothed_rsi(close, 14, 9)),
+        atr=tuple(calculate_atr(high, low, close, 14)),
+    )
+
+
+def _read_only(values: np.ndarray) -> np.ndarray:
+    """Lock a session-shared array so a test cannot modify it in place."""
+    values.setflags(write=False)
+    return values
+
+
+# The trend series are deterministic and read-only, so each xdist worker
+# builds them once and shares them across its tests
+
+@pytest.fixture(scope="session")
 def sample_uptrend_prices():
     """Generate strong uptrend price data (for testing overbought RSI)."""
-    return [100.0 + i * 2 for i in range(30)]
+    return _read_only(100.0 + 2.0 * np.arange(30))
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_downtrend_prices():
     """Generate strong downtrend price data (for testing oversold RSI)."""
-    return [200.0 - i * 2 for i in range(30)]
+    return _read_only(200.0 - 2.0 * np.arange(30))
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_sideways_prices():
     """Generate sideways/ranging price data (for testing neutral RSI)."""
-    return [100.0 + (i % 2) * 1 for i in range(30)]
+    return _read_only(100.0 + np.arange(30) % 2)
 
 
 @pytest.fixture
@@ -88,38 +130,113 @@ def sample_tickers():
 # Mock Fixtures
 # ============================================================================
 
+@pytest.fixture(autouse=True)
+def clear_fetcher_cache():
+    """Clear the shared ticker TTL cache so tests don't see each other's data."""
+    from data_fetcher import CryptoDataFetcher
+    CryptoDataFetcher._ticker_cache.clear()
+    yield
+    CryptoDataFetcher._ticker_cache.clear()
+
+
 @pytest.fixture
 def mock_binance_api(sample_klines, sample_tickers):
-    """Mock Binance API calls via aiohttp."""
-    with patch('data_fetcher.aiohttp.ClientSession') as mock_session:
-        # Create mock response
-        mock_response = AsyncMock()
-        mock_response.status = 200
+    """Mock Binance API calls via httpx."""
+    with patch('data_fetcher.httpx.AsyncClient') as mock_client:
+        # Every streamed request yields the sample tickers
+        mock_client.return_value = FakeSession(FakeResponse(200, sample_tickers))
+        yield mock_client
+
+
+class FakeResponse:
+    """Lightweight stand-in for a streamed httpx response (`async with` target)."""
+
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.read_calls = 0
 
-        # Configure different responses based on URL
-        async def mock_json():
-            return sample_tickers
+    async def __aenter__(self):
+        return self
 
-        mock_response.json = mock_json
+    async def __aexit__(self, *exc):
+        return False
 
-        # Setup context managers
-        mock_context = AsyncMock()
-        mock_context.__aenter__.return_value = mock_response
-        mock_context.__aexit__.return_value = None
+    def json(self):
+        self.read_calls += 1
+        return self._payload
 
-        mock_session_instance = MagicMock()
-        mock_session_instance.get.return_value = mock_context
-        mock_session_instance.__aenter__ = AsyncMock(return_value=mock_session_instance)
-        mock_session_instance.__aexit__ = AsyncMock(return_value=None)
+    async def aread(self):
+        self.read_calls += 1
+        return orjson.dumps(self._payload)
 
-        mock_session.return_value = mock_session_instance
 
-        yield mock_session
+class FakeSession:
+    """Lightweight stand-in for httpx.AsyncClient that records requested URLs."""
+
+    is_closed = False
+
+    def __init__(self, response_or_exc):
+        self.response = response_or_exc
+        self.calls = []
+
+    def stream(self, method, url, **kwargs):
+        self.calls.append(url)
+        if isinstance(self.response, BaseException):
+            raise self.response
+        return self.response
+
+    async def aclose(self):
+        self.is_closed = True
+
+
+@pytest.fixture
+def make_fetcher():
+    """Factory for a CryptoDataFetcher wired to a FakeSession.
+
+    Every `session.stream()` yields a response with the given status and JSON
+    payload; pass `side_effect` to make `session.stream()` raise instead.
+    Requested URLs are recorded in `fetcher.session.calls`.
+    """
+    from data_fetcher import CryptoDataFetcher
+
+    def _make(status=200, payload=None, side_effect=None):
+        fetcher = CryptoDataFetcher()
+        fetcher.session = FakeSession(
+            side_effect if side_effect is not None else FakeResponse(status, payload)
+        )
+        return fetcher
+
+    return _make
 
 
 @pytest.fixture
-def mock_gemini_service():
+def heatmap_fetcher():
+    """Patch main.CryptoDataFetcher; returns a factory for its instance.
+
+    `heatmap_fetcher(symbols, klines)` wires an AsyncMock fetcher usable as
+    `async with CryptoDataFetcher() as f` whose get_top_symbols/get_klines
+    return the given values.
+    """
+    with patch('main.CryptoDataFetcher') as fetcher_class:
+        def _configure(symbols=(), klines=None):
+            fetcher = AsyncMock()
+            fetcher.get_top_symbols.return_value = list(symbols)
+            fetcher.get_klines.return_value = klines
+            fetcher.__aenter__.return_value = fetcher
+            fetcher.__aexit__.return_value = None
+            fetcher_class.return_value = fetcher
+            return fetcher
+
+        yield _configure
+
+
+@pytest.fixture
+def mock_gemini_service(app_module):
     """Mock GeminiService to avoid actual API calls."""
+    # Depends on app_module so main is imported before this patch starts;
+    # otherwise its module-level GeminiService binding and instance would
+    # stay mocks for the rest of the session
     with patch('gemini_service.GeminiService') as MockService:
         instance = MagicMock()
         instance.is_configured.return_value = True
@@ -144,6 +261,105 @@ def mock_gemini_service():
         yield instance
 
 
+@pytest.fixture
+def mocked_services(app_module, monkeypatch):
+    """Swap main's gemini_service and cache_manager for mocks in one step.
+
+    The service reports itself configured and has awaitable generate calls;
+    set return values/side effects on `mocked_services.svc` / `.cache`.
+    """
+    svc = MagicMock()
+    svc.is_configured.return_value = True
+    svc.generate_response = AsyncMock()
+    svc.generate_fundamental_analysis = AsyncMock()
+    cache = MagicMock()
+    monkeypatch.setattr(app_module, 'gemini_service', svc)
+    monkeypatch.setattr(app_module, 'cache_manager', cache)
+    return SimpleNamespace(svc=svc, cache=cache)
+
+
+def _add_async_methods(mock_model):
+    """Make the model's generate/send calls awaitable, as in the real SDK."""
+    mock_model.generate_content_async = AsyncMock()
+    mock_model.start_chat.return_value.send_message_async = AsyncMock()
+
+
+def _mock_genai():
+    """MagicMock `genai` module whose model exposes awaitable generate calls."""
+    # Built fresh for every use: a copy.copy() of a shared prototype would
+    # share child mocks, leaking side effects between tests
+    mock_genai = MagicMock()
+    _add_async_methods(mock_genai.GenerativeModel.return_value)
+    return mock_genai
+
+
+@pytest.fixture
+def gemini_env(monkeypatch):
+    """Configured GeminiService environment with a mocked `genai` module.
+
+    Patches the API key, selected model and `genai` in one place; configure
+    `gemini_env.GenerativeModel.return_value` for per-test model behaviour.
+    """
+    from gemini_service import DEFAULT_MODEL
+
+    mock_genai = _mock_genai()
+    monkeypatch.setattr('gemini_service.get_api_key', lambda: 'test-key')
+    monkeypatch.setattr('gemini_service.get_selected_model', lambda: DEFAULT_MODEL)
+    monkeypatch.setattr('gemini_service.genai', mock_genai)
+    return mock_genai
+
+
+@pytest.fixture(scope="class")
+def class_gemini_env():
+    """Class-scoped counterpart of gemini_env, active for the whole test class."""
+    from gemini_service import DEFAULT_MODEL
+
+    with patch('gemini_service.get_api_key', return_value='test-key'), \
+            patch('gemini_service.get_selected_model', return_value=DEFAULT_MODEL), \
+            patch('gemini_service.genai', _mock_genai()) as mock_genai:
+        yield mock_genai
+
+
+@pytest.fixture(scope="class")
+def shared_gemini_service(class_gemini_env):
+    """One configured GeminiService shared by every test in a class."""
+    from gemini_service import GeminiService
+    return GeminiService()
+
+
+@pytest.fixture
+def configured_service(shared_gemini_service):
+    """Shared GeminiService whose model mock is reset after each test.
+
+    `service.model` is also what `genai.GenerativeModel()` returns, so it
+    drives both chat and fundamental-analysis calls.
+    """
+    yield shared_gemini_service
+    shared_gemini_service.model.reset_mock(return_value=True, side_effect=True)
+    _add_async_methods(shared_gemini_service.model)
+
+
+class FakeClock:
+    """Manually advanced stand-in for `time.time()`."""
+
+    def __init__(self, start: float = 1700000000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def tick(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def frozen_time(monkeypatch):
+    """Freeze cache_manager's clock; advance it with `frozen_time.tick(seconds)`."""
+    clock = FakeClock()
+    monkeypatch.setattr('cache_manager.time', SimpleNamespace(time=clock))
+    return clock
+
+
 @pytest.fixture
 def temp_cache_db():
     """Create a temporary SQLite database for cache testing."""
@@ -171,17 +387,62 @@ def temp_api_key_file():
         os.unlink(temp_path)
 
 
+@pytest.fixture
+def key_files(tmp_path, monkeypatch):
+    """Point the API key and disabled-flag files at a temp directory.
+
+    Returns `(api_key_file, disabled_file)`; neither exists initially.
+    """
+    api_key_file = tmp_path / ".api_key"
+    disabled_file = tmp_path / ".api_key_disabled"
+    monkeypatch.setattr('gemini_service.API_KEY_FILE', api_key_file)
+    monkeypatch.setattr('gemini_service.API_KEY_DISABLED_FILE', disabled_file)
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    return api_key_file, disabled_file
+
+
+@pytest.fixture(scope="session")
+def canned_response():
+    """Gemini response in the SDK's shape, loaded once per session.
+
+    Set it as a mocked `send_message_async` / `generate_content_async`
+    return value; `.text` is the reply the service reads.
+    """
+    # Read directly so a missing fixture fails with FileNotFoundError
+    data = json.loads((Path(__file__).parent / 'fixtures' / 'gemini_chat.json').read_text())
+    return SimpleNamespace(**data)
+
+
 # ============================================================================
 # FastAPI Test Client Fixtures
 # ============================================================================
 
+@pytest.fixture(scope="session")
+def app_module():
+    """The `main` module, imported once per session with its real services."""
+    import main
+    return main
+
+
+@pytest.fixture(scope="session")
+def client(app_module):
+    """FastAPI TestClient shared by every test in the session.
+
+    Endpoint dependencies are patched per test with `patch(...)` context
+    managers, so the client itself carries no per-test state. Unhandled
+    server errors come back as 500 responses instead of being re-raised,
+    matching what a real client would see.
+    """
+    from fastapi.testclient import TestClient
+    return TestClient(app_module.app, raise_server_exceptions=False)
+
+
 @pytest.fixture
-async def async_client(mock_gemini_service):
+async def async_client(mock_gemini_service, app_module):
     """Create async test client for FastAPI endpoints."""
     from httpx import AsyncClient, ASGITransport
-    from main import app
 
-    transport = ASGITransport(app=app)
+    transport = ASGITransport(app=app_module.app)
     async with AsyncClient(transport=transport, base_url='http://test') as client:
         yield client
 
@@ -6,9 +6,27 @@ These tests verify the heatmap API endpoint behavior with mocked external servic
 import pytest
 from unittest.mock import patch, AsyncMock, MagicMock
 
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+import numpy as np
+
+from data_fetcher import KLINE_DTYPE
+
+
+def _build_sample_klines(n=100):
+    """100 steadily rising 4h candles, filled column by column."""
+    step = np.arange(n)
+    klines = np.zeros(n, dtype=KLINE_DTYPE)
+    klines['timestamp'] = 1700000000000 + step * 14400000
+    klines['open'] = 42000 + step * 10
+    klines['high'] = 42100 + step * 10
+    klines['low'] = 41900 + step * 10
+    klines['close'] = 42050 + step * 10
+    klines['volume'] = 1000 + step
+    klines.setflags(write=False)
+    return klines
+
+
+# Built once at import; read-only since every test shares it
+SAMPLE_KLINES = _build_sample_klines()
 
 
 # ============================================================================
@@ -31,16 +49,7 @@ def mock_data_fetcher():
         ])
 
         # Mock get_klines with realistic data
-        sample_klines = [
-            {'timestamp': 1700000000000 + i * 14400000,
-             'open': 42000 + i * 10,
-             'high': 42100 + i * 10,
-             'low': 41900 + i * 10,
-             'close': 42050 + i * 10,
-             'volume': 1000 + i}
-            for i in range(100)
-        ]
-        instance.get_klines = AsyncMock(return_value=sample_klines)
+        instance.get_klines = AsyncMock(return_value=SAMPLE_KLINES)
 
         MockFetcher.return_value = instance
         yield MockFetcher
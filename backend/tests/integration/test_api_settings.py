@@ -6,10 +6,6 @@ These tests verify the API key and model settings management endpoints.
 import pytest
 from unittest.mock import patch, MagicMock
 
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-
 
 # ============================================================================
 # Test: API Key Status Endpoint
@@ -7,7 +7,6 @@ import pytest
 from unittest.mock import patch, MagicMock
 import tempfile
 import os
-import time
 
 from cache_manager import CacheManager
 
@@ -80,7 +79,7 @@ class TestGetCacheEdgeCases:
             assert result is None
 
     @pytest.mark.unit
-    def test_get_cache_cleans_expired(self):
+    def test_get_cache_cleans_expired(self, frozen_time):
         """Should clean expired entries during get."""
         with tempfile.TemporaryDirectory() as tmpdir:
             with patch('cache_manager.os.path.dirname', return_value=tmpdir):
@@ -90,8 +89,8 @@ class TestGetCacheEdgeCases:
                     # Set cache with very short TTL
                     manager.set_cache(100, "4h", {"test": "data"}, ttl_seconds=1)
 
-                    # Wait for expiration
-                    time.sleep(1.1)
+                    # Advance the clock past the TTL
+                    frozen_time.tick(1.1)
 
                     # Get should return None and clean up
                     result = manager.get_cache(100, "4h")
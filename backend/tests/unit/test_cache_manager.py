@@ -6,13 +6,7 @@ Each test gets a fresh database that is automatically cleaned up after.
 """
 import pytest
 import os
-import time
 import tempfile
-import json
-
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from cache_manager import CacheManager
 
@@ -191,20 +185,20 @@ class TestCacheExpiration:
         assert result == data
 
     @pytest.mark.unit
-    def test_cache_expired_after_ttl(self, temp_cache):
+    def test_cache_expired_after_ttl(self, temp_cache, frozen_time):
         """Cache should return None after TTL expires."""
         data = {'test': 'data'}
         # Set with very short TTL
         temp_cache.set_cache(limit=100, timeframe='4h', data=data, ttl_seconds=1)
 
-        # Wait for expiration
-        time.sleep(1.5)
+        # Advance the clock past the TTL
+        frozen_time.tick(1.5)
 
         result = temp_cache.get_cache(limit=100, timeframe='4h')
         assert result is None
 
     @pytest.mark.unit
-    def test_different_ttl_values(self, temp_cache):
+    def test_different_ttl_values(self, temp_cache, frozen_time):
         """Different TTL values should be respected."""
         data_short = {'ttl': 'short'}
         data_long = {'ttl': 'long'}
@@ -214,8 +208,8 @@ class TestCacheExpiration:
         # Longer TTL (60 seconds)
         temp_cache.set_cache(limit=100, timeframe='4h', data=data_long, ttl_seconds=60)
 
-        # Wait for short TTL to expire
-        time.sleep(1.5)
+        # Advance the clock past the short TTL
+        frozen_time.tick(1.5)
 
         # Short TTL should be expired
         assert temp_cache.get_cache(100, '1h') is None
@@ -231,14 +225,14 @@ class TestCacheCleanup:
     """Tests for automatic cache cleanup."""
 
     @pytest.mark.unit
-    def test_expired_entries_cleaned_on_get(self, temp_cache):
+    def test_expired_entries_cleaned_on_get(self, temp_cache, frozen_time):
         """Expired entries should be cleaned up when get_cache is called."""
         # Set data that will expire
         temp_cache.set_cache(limit=50, timeframe='1h', data={'old': 'data'}, ttl_seconds=1)
         temp_cache.set_cache(limit=100, timeframe='4h', data={'new': 'data'}, ttl_seconds=60)
 
-        # Wait for first entry to expire
-        time.sleep(1.5)
+        # Advance the clock past the first entry's TTL
+        frozen_time.tick(1.5)
 
         # Get any cache - this should trigger cleanup
         result = temp_cache.get_cache(limit=100, timeframe='4h')
@@ -3,11 +3,17 @@ Unit tests for CryptoDataFetcher
 
 Tests the data fetching functionality with mocked HTTP responses.
 """
+import asyncio
+import logging
+
+import httpx
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
-import aiohttp
 
-from data_fetcher import CryptoDataFetcher
+from data_fetcher import CryptoDataFetcher, KLINE_DTYPE
+
+
+# Non-200 statuses every fetcher must map to its empty sentinel
+HTTP_ERROR_STATUSES = [400, 404, 429, 500, 503]
 
 
 # ============================================================================
@@ -38,6 +44,20 @@ class TestCryptoDataFetcherInit:
         """Should have correct Binance API URL."""
         assert CryptoDataFetcher.BINANCE_API == "https://data-api.binance.vision/api/v3"
 
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_klines_request_url(self, make_fetcher):
+        """Should request the pre-parsed klines URL with query params."""
+        fetcher = make_fetcher(200, [])
+
+        await fetcher.get_klines("BTCUSDT", "4h", 100)
+
+        url = fetcher.session.calls[-1]
+        assert str(url) == (
+            "https://data-api.binance.vision/api/v3/klines"
+            "?symbol=BTCUSDT&interval=4h&limit=100"
+        )
+
 
 # ============================================================================
 # Test: get_top_symbols
@@ -48,7 +68,7 @@ class TestGetTopSymbols:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_top_symbols_success(self):
+    async def test_get_top_symbols_success(self, make_fetcher):
         """Should return list of symbols on success."""
         mock_data = [
             {"symbol": "BTCUSDT", "quoteVolume": "1000000000"},
@@ -56,18 +76,7 @@ class TestGetTopSymbols:
             {"symbol": "SOLUSDT", "quoteVolume": "100000000"},
             {"symbol": "USDCUSDT", "quoteVolume": "50000000"},  # Should be filtered
         ]
-
-        fetcher = CryptoDataFetcher()
-
-        # Mock the session and response
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=mock_data)
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response)))
-
-        fetcher.session = mock_session
+        fetcher = make_fetcher(200, mock_data)
 
         result = await fetcher.get_top_symbols(limit=3)
 
@@ -79,17 +88,10 @@ class TestGetTopSymbols:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_top_symbols_api_error(self):
+    @pytest.mark.parametrize("status", HTTP_ERROR_STATUSES)
+    async def test_get_top_symbols_api_error(self, make_fetcher, status):
         """Should return empty list on API error."""
-        fetcher = CryptoDataFetcher()
-
-        mock_response = AsyncMock()
-        mock_response.status = 500
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response)))
-
-        fetcher.session = mock_session
+        fetcher = make_fetcher(status)
 
         result = await fetcher.get_top_symbols()
 
@@ -103,49 +105,52 @@ class TestGetTopSymbols:
 class TestGetKlines:
     """Tests for get_klines method."""
 
+    MOCK_KLINES = [
+        [1703980800000, "42000.00", "42500.00", "41800.00", "42300.00", "1000.5", 0, 0, 0, 0, 0, 0],
+        [1703984400000, "42300.00", "42800.00", "42100.00", "42600.00", "800.3", 0, 0, 0, 0, 0, 0],
+    ]
+
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_klines_success(self):
+    async def test_get_klines_success(self, make_fetcher):
         """Should return formatted kline data on success."""
-        mock_klines = [
-            [1703980800000, "42000.00", "42500.00", "41800.00", "42300.00", "1000.5", 0, 0, 0, 0, 0, 0],
-            [1703984400000, "42300.00", "42800.00", "42100.00", "42600.00", "800.3", 0, 0, 0, 0, 0, 0],
-        ]
-
-        fetcher = CryptoDataFetcher()
-
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=mock_klines)
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response)))
-
-        fetcher.session = mock_session
+        fetcher = make_fetcher(200, self.MOCK_KLINES)
 
         result = await fetcher.get_klines("BTCUSDT", "4h", 100)
 
         assert len(result) == 2
-        assert result[0]['timestamp'] == 1703980800000
-        assert result[0]['open'] == 42000.00
-        assert result[0]['high'] == 42500.00
-        assert result[0]['low'] == 41800.00
-        assert result[0]['close'] == 42300.00
-        assert result[0]['volume'] == 1000.5
+        assert result.dtype == KLINE_DTYPE
+        assert result['timestamp'][0] == 1703980800000
+        assert result['open'][0] == 42000.00
+        assert result['high'][0] == 42500.00
+        assert result['low'][0] == 41800.00
+        assert result['close'][0] == 42300.00
+        assert result['volume'][0] == 1000.5
+        assert result['close'].tolist() == [42300.00, 42600.00]
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_klines_api_error(self):
-        """Should return empty list on API error."""
-        fetcher = CryptoDataFetcher()
+    async def test_get_klines_as_dict(self, make_fetcher):
+        """as_dict=True should return the legacy list of dicts."""
+        fetcher = make_fetcher(200, self.MOCK_KLINES[:1])
 
-        mock_response = AsyncMock()
-        mock_response.status = 404
+        result = await fetcher.get_klines("BTCUSDT", "4h", 100, as_dict=True)
 
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response)))
+        assert result == [{
+            'timestamp': 1703980800000,
+            'open': 42000.00,
+            'high': 42500.00,
+            'low': 41800.00,
+            'close': 42300.00,
+            'volume': 1000.5
+        }]
 
-        fetcher.session = mock_session
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("status", HTTP_ERROR_STATUSES)
+    async def test_get_klines_api_error(self, make_fetcher, status):
+        """Should return empty list on API error."""
+        fetcher = make_fetcher(status)
 
         result = await fetcher.get_klines("INVALIDPAIR", "4h")
 
@@ -153,19 +158,23 @@ class TestGetKlines:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_klines_exception(self):
+    async def test_get_klines_exception(self, make_fetcher):
         """Should return empty list on exception."""
-        fetcher = CryptoDataFetcher()
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(side_effect=Exception("Network error"))
-
-        fetcher.session = mock_session
+        fetcher = make_fetcher(side_effect=httpx.ConnectError("Network error"))
 
         result = await fetcher.get_klines("BTCUSDT", "4h")
 
         assert result == []
 
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_get_klines_unexpected_error_propagates(self, make_fetcher):
+        """Non-network errors are bugs and should not be swallowed."""
+        fetcher = make_fetcher(side_effect=RuntimeError("bug"))
+
+        with pytest.raises(RuntimeError):
+            await fetcher.get_klines("BTCUSDT", "4h")
+
 
 # ============================================================================
 # Test: get_ticker_24h
@@ -176,7 +185,7 @@ class TestGetTicker24h:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_ticker_success(self):
+    async def test_get_ticker_success(self, make_fetcher):
         """Should return ticker data on success."""
         mock_ticker = {
             "symbol": "BTCUSDT",
@@ -184,19 +193,9 @@ class TestGetTicker24h:
             "priceChangePercent": "2.5",
             "lastPrice": "42000.00"
         }
+        fetcher = make_fetcher(200, mock_ticker)
 
-        fetcher = CryptoDataFetcher()
-
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=mock_ticker)
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response)))
-
-        fetcher.session = mock_session
-
-        result = await fetcher.get_ticker_24h("BTCUSDT")
+        result = await fetcher.get_ticker_24h("BTCUSDT", force_individual=True)
 
         assert result is not None
         assert result['symbol'] == "BTCUSDT"
@@ -204,36 +203,59 @@ class TestGetTicker24h:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_ticker_api_error(self):
+    @pytest.mark.parametrize("status", HTTP_ERROR_STATUSES)
+    async def test_get_ticker_api_error(self, make_fetcher, status):
         """Should return None on API error."""
-        fetcher = CryptoDataFetcher()
+        fetcher = make_fetcher(status)
 
-        mock_response = AsyncMock()
-        mock_response.status = 400
+        result = await fetcher.get_ticker_24h("INVALID")
 
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response)))
+        assert result is None
 
-        fetcher.session = mock_session
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_get_ticker_exception(self, make_fetcher):
+        """Should return None on exception."""
+        fetcher = make_fetcher(side_effect=httpx.ReadTimeout("Timeout"))
 
-        result = await fetcher.get_ticker_24h("INVALID")
+        result = await fetcher.get_ticker_24h("BTCUSDT")
 
         assert result is None
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_ticker_exception(self):
-        """Should return None on exception."""
-        fetcher = CryptoDataFetcher()
+    async def test_get_ticker_exception_logged_lazily(self, make_fetcher, caplog):
+        """Failures should be logged with deferred %-style arguments."""
+        fetcher = make_fetcher(side_effect=httpx.ReadTimeout("Timeout"))
 
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(side_effect=Exception("Timeout"))
+        with caplog.at_level(logging.WARNING, logger="data_fetcher"):
+            await fetcher.get_ticker_24h("BTCUSDT", force_individual=True)
 
-        fetcher.session = mock_session
+        record = caplog.records[-1]
+        assert record.msg == "Error fetching ticker %s: %s"
+        assert record.args[0] == "BTCUSDT"
+        assert record.getMessage() == "Error fetching ticker BTCUSDT: Timeout"
 
-        result = await fetcher.get_ticker_24h("BTCUSDT")
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_get_ticker_from_index(self, make_fetcher):
+        """Concurrent lookups should share one all-tickers request."""
+        mock_tickers = [
+            {"symbol": "BTCUSDT", "lastPrice": "42000.00"},
+            {"symbol": "ETHUSDT", "lastPrice": "2200.00"},
+        ]
+        fetcher = make_fetcher(200, mock_tickers)
 
-        assert result is None
+        btc, eth, missing = await asyncio.gather(
+            fetcher.get_ticker_24h("BTCUSDT"),
+            fetcher.get_ticker_24h("ETHUSDT"),
+            fetcher.get_ticker_24h("NOPEUSDT"),
+        )
+
+        assert btc["lastPrice"] == "42000.00"
+        assert eth["lastPrice"] == "2200.00"
+        assert missing is None
+        assert len(fetcher.session.calls) == 1
 
 
 # ============================================================================
@@ -245,23 +267,13 @@ class TestGetAllTickers:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_all_tickers_success(self):
+    async def test_get_all_tickers_success(self, make_fetcher):
         """Should return list of tickers on success."""
         mock_tickers = [
             {"symbol": "BTCUSDT", "lastPrice": "42000.00"},
             {"symbol": "ETHUSDT", "lastPrice": "2200.00"},
         ]
-
-        fetcher = CryptoDataFetcher()
-
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=mock_tickers)
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response)))
-
-        fetcher.session = mock_session
+        fetcher = make_fetcher(200, mock_tickers)
 
         result = await fetcher.get_all_tickers()
 
@@ -270,21 +282,83 @@ class TestGetAllTickers:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_all_tickers_error(self):
+    @pytest.mark.parametrize("status", HTTP_ERROR_STATUSES)
+    async def test_get_all_tickers_error(self, make_fetcher, status):
         """Should return empty list on error."""
-        fetcher = CryptoDataFetcher()
+        fetcher = make_fetcher(status)
 
-        mock_response = AsyncMock()
-        mock_response.status = 500
+        result = await fetcher.get_all_tickers()
 
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response)))
+        assert result == []
 
-        fetcher.session = mock_session
 
-        result = await fetcher.get_all_tickers()
+# ============================================================================
+# Test: ticker TTL cache
+# ============================================================================
 
-        assert result == []
+class TestTickerCache:
+    """Tests for the shared TTL cache on ticker endpoints."""
+
+    TICKERS = [{"symbol": "BTCUSDT", "lastPrice": "42000.00"}]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_second_call_served_from_cache(self, make_fetcher):
+        """Repeated calls within the TTL should not hit the network."""
+        fetcher = make_fetcher(200, self.TICKERS)
+
+        first = await fetcher.get_all_tickers()
+        second = await fetcher.get_all_tickers()
+
+        assert first == second
+        assert len(fetcher.session.calls) == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_cache_shared_across_instances(self, make_fetcher):
+        """A new fetcher instance should reuse cached ticker data."""
+        first = make_fetcher(200, {"symbol": "BTCUSDT", "lastPrice": "42000.00"})
+        await first.get_ticker_24h("BTCUSDT", force_individual=True)
+
+        second = make_fetcher(200, {"symbol": "BTCUSDT", "lastPrice": "1.00"})
+        result = await second.get_ticker_24h("BTCUSDT", force_individual=True)
+
+        assert result["lastPrice"] == "42000.00"
+        assert second.session.calls == []
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_force_refresh_bypasses_cache(self, make_fetcher):
+        """force_refresh=True should always hit the network."""
+        fetcher = make_fetcher(200, self.TICKERS)
+
+        await fetcher.get_all_tickers()
+        await fetcher.get_all_tickers(force_refresh=True)
+
+        assert len(fetcher.session.calls) == 2
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_cached_result_is_copied(self, make_fetcher):
+        """Mutating a returned payload should not corrupt the cache."""
+        fetcher = make_fetcher(200, self.TICKERS)
+
+        first = await fetcher.get_all_tickers()
+        first[0]["lastPrice"] = "0"
+        second = await fetcher.get_all_tickers()
+
+        assert second[0]["lastPrice"] == "42000.00"
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_empty_result_not_cached(self, make_fetcher):
+        """Failed (empty) results should be retried on the next call."""
+        fetcher = make_fetcher(200, [])
+
+        await fetcher.get_all_tickers()
+        await fetcher.get_all_tickers()
+
+        assert len(fetcher.session.calls) == 2
 
 
 # ============================================================================
@@ -296,20 +370,10 @@ class TestFetchMultiTimeframeData:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_fetch_multi_timeframe_returns_dict(self):
+    async def test_fetch_multi_timeframe_returns_dict(self, make_fetcher):
         """Should return dict with timeframe keys."""
-        fetcher = CryptoDataFetcher()
-
         mock_klines = [[1703980800000, "42000", "42500", "41800", "42300", "1000", 0, 0, 0, 0, 0, 0]]
-
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=mock_klines)
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response)))
-
-        fetcher.session = mock_session
+        fetcher = make_fetcher(200, mock_klines)
 
         result = await fetcher.fetch_multi_timeframe_data("BTCUSDT", ["1h", "4h"])
 
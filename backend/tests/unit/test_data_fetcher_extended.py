@@ -3,9 +3,10 @@ Extended tests for data_fetcher.py to achieve 90%+ coverage
 
 Covers context managers and edge cases.
 """
+import asyncio
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
-import aiohttp
+from unittest.mock import AsyncMock, patch
+import httpx
 
 from data_fetcher import CryptoDataFetcher
 
@@ -14,35 +15,109 @@ from data_fetcher import CryptoDataFetcher
 # Test: Context Manager
 # ============================================================================
 
+@pytest.fixture
+def reset_shared_session():
+    """Isolate the class-level shared session between tests."""
+    CryptoDataFetcher._shared_session = None
+    CryptoDataFetcher._shared_loop = None
+    yield
+    CryptoDataFetcher._shared_session = None
+    CryptoDataFetcher._shared_loop = None
+
+
+@pytest.mark.usefixtures("reset_shared_session")
 class TestContextManager:
     """Tests for async context manager."""
 
     @pytest.mark.unit
     @pytest.mark.asyncio
     async def test_aenter_creates_session(self):
-        """__aenter__ should create aiohttp session."""
+        """__aenter__ should create an httpx client."""
         fetcher = CryptoDataFetcher()
 
-        with patch('aiohttp.ClientSession') as mock_session_class:
+        with patch('httpx.AsyncClient') as mock_session_class:
+            mock_session = AsyncMock()
+            mock_session.is_closed = False
+            mock_session_class.return_value = mock_session
+
+            result = await fetcher.__aenter__()
+
+            assert result is fetcher
+            assert fetcher.session is mock_session
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_aenter_reuses_shared_session(self):
+        """Concurrent fetchers should share one session."""
+        with patch('httpx.AsyncClient') as mock_session_class:
             mock_session = AsyncMock()
+            mock_session.is_closed = False
             mock_session_class.return_value = mock_session
 
-            with patch('aiohttp.TCPConnector'):
-                result = await fetcher.__aenter__()
+            first = await CryptoDataFetcher().__aenter__()
+            second = await CryptoDataFetcher().__aenter__()
+
+        assert first.session is second.session
+        assert mock_session_class.call_count == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_aenter_replaces_session_from_other_loop(self):
+        """A session bound to another event loop should be dropped, not closed."""
+        stale = AsyncMock()
+        stale.is_closed = False
+        CryptoDataFetcher._shared_session = stale
+        CryptoDataFetcher._shared_loop = object()
+
+        with patch('httpx.AsyncClient') as mock_session_class:
+            fresh = AsyncMock()
+            fresh.is_closed = False
+            mock_session_class.return_value = fresh
 
-                assert result is fetcher
+            fetcher = await CryptoDataFetcher().__aenter__()
+
+        assert fetcher.session is fresh
+        assert CryptoDataFetcher._shared_session is fresh
+        stale.aclose.assert_not_called()
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_aexit_keeps_shared_session_open(self):
+        """__aexit__ should release the shared session without closing it."""
+        fetcher = CryptoDataFetcher()
+        mock_session = AsyncMock()
+        CryptoDataFetcher._shared_session = mock_session
+        fetcher.session = mock_session
+
+        await fetcher.__aexit__(None, None, None)
+
+        mock_session.aclose.assert_not_called()
+        assert fetcher.session is None
 
     @pytest.mark.unit
     @pytest.mark.asyncio
     async def test_aexit_closes_session(self):
-        """__aexit__ should close session."""
+        """__aexit__ should close a session that is not the shared one."""
         fetcher = CryptoDataFetcher()
         mock_session = AsyncMock()
         fetcher.session = mock_session
 
         await fetcher.__aexit__(None, None, None)
 
-        mock_session.close.assert_called_once()
+        mock_session.aclose.assert_called_once()
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_close_shared_session(self):
+        """close_shared_session should close and drop the shared session."""
+        mock_session = AsyncMock()
+        mock_session.is_closed = False
+        CryptoDataFetcher._shared_session = mock_session
+
+        await CryptoDataFetcher.close_shared_session()
+
+        mock_session.aclose.assert_called_once()
+        assert CryptoDataFetcher._shared_session is None
 
     @pytest.mark.unit
     @pytest.mark.asyncio
@@ -64,14 +139,9 @@ class TestGetAllTickersEdgeCases:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_all_tickers_exception(self):
+    async def test_get_all_tickers_exception(self, make_fetcher):
         """Should return empty list on exception."""
-        fetcher = CryptoDataFetcher()
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(side_effect=Exception("Connection timeout"))
-
-        fetcher.session = mock_session
+        fetcher = make_fetcher(side_effect=httpx.ConnectTimeout("Connection timeout"))
 
         result = await fetcher.get_all_tickers()
 
@@ -87,7 +157,7 @@ class TestGetTopSymbolsEdgeCases:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_top_symbols_filters_zero_volume(self):
+    async def test_get_top_symbols_filters_zero_volume(self, make_fetcher):
         """Should filter out zero volume pairs."""
         mock_data = [
             {"symbol": "BTCUSDT", "quoteVolume": "1000000"},
@@ -95,18 +165,7 @@ class TestGetTopSymbolsEdgeCases:
             {"symbol": "ETHUSDT", "quoteVolume": "500000"},
         ]
 
-        fetcher = CryptoDataFetcher()
-
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=mock_data)
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(
-            return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response))
-        )
-
-        fetcher.session = mock_session
+        fetcher = make_fetcher(200, mock_data)
 
         result = await fetcher.get_top_symbols(limit=10)
 
@@ -115,29 +174,74 @@ class TestGetTopSymbolsEdgeCases:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_top_symbols_limit(self):
+    async def test_get_top_symbols_limit(self, make_fetcher):
         """Should respect limit parameter."""
         mock_data = [
             {"symbol": f"COIN{i}USDT", "quoteVolume": str(1000000 - i * 1000)}
             for i in range(50)
         ]
 
-        fetcher = CryptoDataFetcher()
+        fetcher = make_fetcher(200, mock_data)
 
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=mock_data)
+        result = await fetcher.get_top_symbols(limit=5)
 
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(
-            return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response))
-        )
+        assert len(result) == 5
 
-        fetcher.session = mock_session
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_get_top_symbols_filters_stablecoins_and_orders(self, make_fetcher):
+        """Should drop stablecoin pairs and return symbols by descending volume."""
+        mock_data = [
+            {"symbol": "ETHUSDT", "quoteVolume": "500000"},
+            {"symbol": "FDUSDUSDT", "quoteVolume": "9000000"},
+            {"symbol": "BTCUSDT", "quoteVolume": "1000000"},
+            {"symbol": "DAIUSDT", "quoteVolume": "8000000"},
+            {"symbol": "SOLUSDT", "quoteVolume": "2000000.5"},
+            {"symbol": "ZEROUSDT", "quoteVolume": "0.00000000"},
+        ]
 
-        result = await fetcher.get_top_symbols(limit=5)
+        fetcher = make_fetcher(200, mock_data)
 
-        assert len(result) == 5
+        result = await fetcher.get_top_symbols(limit=10)
+
+        assert result == ["SOLUSDT", "BTCUSDT", "ETHUSDT"]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_get_top_symbols_numeric_order_mixed_widths(self, make_fetcher):
+        """Volumes of different widths must rank numerically, not lexically."""
+        mock_data = [
+            {"symbol": "AAAUSDT", "quoteVolume": "999.99000000"},
+            {"symbol": "BBBUSDT", "quoteVolume": "1000.00000000"},
+            {"symbol": "CCCUSDT", "quoteVolume": "85.50000000"},
+        ]
+        fetcher = make_fetcher(200, mock_data)
+
+        result = await fetcher.get_top_symbols(limit=3)
+
+        assert result == ["BBBUSDT", "AAAUSDT", "CCCUSDT"]
+
+
+# ============================================================================
+# Test: HTTP error paths
+# ============================================================================
+
+class TestHttpErrorSkipsBody:
+    """Error statuses should short-circuit before the body is read."""
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_error_status_does_not_read_body(self, make_fetcher):
+        """Non-200 responses should never be downloaded or decoded."""
+        fetcher = make_fetcher(503, "<html>Service Unavailable</html>")
+        response = fetcher.session.response
+
+        assert await fetcher.get_klines("BTCUSDT", "4h") == []
+        assert await fetcher.get_ticker_24h("BTCUSDT") is None
+        assert await fetcher.get_all_tickers() == []
+        assert await fetcher.get_top_symbols() == []
+
+        assert response.read_calls == 0
 
 
 # ============================================================================
@@ -149,20 +253,9 @@ class TestGetKlinesEdgeCases:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_klines_empty_response(self):
+    async def test_get_klines_empty_response(self, make_fetcher):
         """Should handle empty response."""
-        fetcher = CryptoDataFetcher()
-
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=[])
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(
-            return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response))
-        )
-
-        fetcher.session = mock_session
+        fetcher = make_fetcher(200, [])
 
         result = await fetcher.get_klines("BTCUSDT", "4h", 100)
 
@@ -170,25 +263,14 @@ class TestGetKlinesEdgeCases:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_get_klines_malformed_data(self):
+    async def test_get_klines_malformed_data(self, make_fetcher):
         """Should handle malformed kline data."""
-        fetcher = CryptoDataFetcher()
-
         # Kline data with fewer elements than expected
         mock_klines = [
             [1700000000, "100", "105"],  # Incomplete
         ]
 
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=mock_klines)
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(
-            return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response))
-        )
-
-        fetcher.session = mock_session
+        fetcher = make_fetcher(200, mock_klines)
 
         # This might raise or return empty - just check it doesn't crash completely
         try:
@@ -208,20 +290,9 @@ class TestFetchMultiTimeframeEdgeCases:
 
     @pytest.mark.unit
     @pytest.mark.asyncio
-    async def test_fetch_multi_empty_timeframes(self):
+    async def test_fetch_multi_empty_timeframes(self, make_fetcher):
         """Should handle empty timeframes list."""
-        fetcher = CryptoDataFetcher()
-
-        mock_response = AsyncMock()
-        mock_response.status = 200
-        mock_response.json = AsyncMock(return_value=[])
-
-        mock_session = AsyncMock()
-        mock_session.get = MagicMock(
-            return_value=AsyncMock(__aenter__=AsyncMock(return_value=mock_response))
-        )
-
-        fetcher.session = mock_session
+        fetcher = make_fetcher(200, [])
 
         result = await fetcher.fetch_multi_timeframe_data("BTCUSDT", [])
 
@@ -249,3 +320,37 @@ class TestFetchMultiTimeframeEdgeCases:
         assert "1h" in result
         assert "4h" in result
         assert "1d" in result
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_fetch_multi_exception_maps_to_empty(self):
+        """A raising timeframe should yield [] without failing the others."""
+        fetcher = CryptoDataFetcher()
+
+        async def mock_get_klines(symbol, interval, limit):
+            if interval == "4h":
+                raise RuntimeError("boom")
+            return [{"timestamp": 1, "open": 1, "high": 1, "low": 1, "close": 1, "volume": 1}]
+
+        fetcher.get_klines = mock_get_klines
+
+        result = await fetcher.fetch_multi_timeframe_data("BTCUSDT", ["1h", "4h"])
+
+        assert result["4h"] == []
+        assert len(result["1h"]) == 1
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_fetch_multi_propagates_cancellation(self):
+        """A cancelled timeframe must not be swallowed into []."""
+        fetcher = CryptoDataFetcher()
+
+        async def mock_get_klines(symbol, interval, limit):
+            if interval == "4h":
+                raise asyncio.CancelledError()
+            return []
+
+        fetcher.get_klines = mock_get_klines
+
+        with pytest.raises(asyncio.CancelledError):
+            await fetcher.fetch_multi_timeframe_data("BTCUSDT", ["1h", "4h"])
@@ -3,18 +3,21 @@ Extended tests for gemini_service.py to achieve 90%+ coverage
 
 Covers error handling paths and edge cases.
 """
+import asyncio
 import pytest
-from unittest.mock import patch, MagicMock, AsyncMock
-import os
+from unittest.mock import ANY, patch, MagicMock
 
 from gemini_service import (
     get_api_key, get_api_key_source, save_api_key,
-    is_api_key_disabled, disable_api_key, enable_api_key,
+    disable_api_key, enable_api_key,
     get_selected_model, save_selected_model, validate_api_key,
-    GeminiService, DEFAULT_MODEL
+    GeminiService, DEFAULT_MODEL, _classify_error, _CHAT_ERROR_PATTERNS
 )
 
 
+pytestmark = pytest.mark.unit
+
+
 # ============================================================================
 # Test: API Key Edge Cases
 # ============================================================================
@@ -22,32 +25,21 @@ from gemini_service import (
 class TestApiKeyEdgeCases:
     """Edge cases for API key management."""
 
-    @pytest.mark.unit
-    def test_get_api_key_empty_file(self):
+    def test_get_api_key_empty_file(self, key_files, monkeypatch):
         """Should return env key if file is empty."""
-        with patch('gemini_service.API_KEY_DISABLED_FILE') as mock_disabled:
-            mock_disabled.exists.return_value = False
-            with patch('gemini_service.API_KEY_FILE') as mock_file:
-                mock_file.exists.return_value = True
-                mock_file.read_text.return_value = '   '  # Whitespace only
-                with patch.dict(os.environ, {'GEMINI_API_KEY': 'env-key'}):
-                    result = get_api_key()
-                    # Empty file should fallback to env
-                    assert result is not None
-
-    @pytest.mark.unit
-    def test_get_api_key_source_empty_file(self):
+        api_key_file, _ = key_files
+        api_key_file.write_text('   ')  # Whitespace only
+        monkeypatch.setenv('GEMINI_API_KEY', 'env-key')
+        # Empty file should fallback to env
+        assert get_api_key() == 'env-key'
+
+    def test_get_api_key_source_empty_file(self, key_files, monkeypatch):
         """Should return env if file is empty."""
-        with patch('gemini_service.API_KEY_DISABLED_FILE') as mock_disabled:
-            mock_disabled.exists.return_value = False
-            with patch('gemini_service.API_KEY_FILE') as mock_file:
-                mock_file.exists.return_value = True
-                mock_file.read_text.return_value = ''
-                with patch.dict(os.environ, {'GEMINI_API_KEY': 'env-key'}):
-                    result = get_api_key_source()
-                    assert result == 'env'
+        api_key_file, _ = key_files
+        api_key_file.write_text('')
+        monkeypatch.setenv('GEMINI_API_KEY', 'env-key')
+        assert get_api_key_source() == 'env'
 
-    @pytest.mark.unit
     def test_save_api_key_exception(self):
         """Should return False on exception."""
         with patch('gemini_service.API_KEY_DISABLED_FILE') as mock_disabled:
@@ -57,17 +49,14 @@ class TestApiKeyEdgeCases:
                 result = save_api_key('test-key')
                 assert result is False
 
-    @pytest.mark.unit
-    def test_disable_api_key_with_existing_file(self):
+    def test_disable_api_key_with_existing_file(self, key_files):
         """Should remove existing API key file when disabling."""
-        with patch('gemini_service.API_KEY_DISABLED_FILE') as mock_disabled:
-            with patch('gemini_service.API_KEY_FILE') as mock_file:
-                mock_file.exists.return_value = True
-                result = disable_api_key()
-                assert result is True
-                mock_file.unlink.assert_called_once()
+        api_key_file, _ = key_files
+        api_key_file.write_text('saved-key')
+        result = disable_api_key()
+        assert result is True
+        assert not api_key_file.exists()
 
-    @pytest.mark.unit
     def test_disable_api_key_exception(self):
         """Should return False on exception."""
         with patch('gemini_service.API_KEY_DISABLED_FILE') as mock_disabled:
@@ -75,15 +64,10 @@ class TestApiKeyEdgeCases:
             result = disable_api_key()
             assert result is False
 
-    @pytest.mark.unit
-    def test_enable_api_key_not_disabled(self):
+    def test_enable_api_key_not_disabled(self, key_files):
         """Should return True even if not disabled."""
-        with patch('gemini_service.API_KEY_DISABLED_FILE') as mock_disabled:
-            mock_disabled.exists.return_value = False
-            result = enable_api_key()
-            assert result is True
+        assert enable_api_key() is True
 
-    @pytest.mark.unit
     def test_enable_api_key_exception(self):
         """Should return False on exception."""
         with patch('gemini_service.API_KEY_DISABLED_FILE') as mock_disabled:
@@ -100,7 +84,6 @@ class TestApiKeyEdgeCases:
 class TestModelEdgeCases:
     """Edge cases for model management."""
 
-    @pytest.mark.unit
     def test_get_selected_model_invalid_json(self):
         """Should return default on invalid JSON."""
         with patch('gemini_service.MODEL_CONFIG_FILE') as mock_file:
@@ -109,7 +92,6 @@ class TestModelEdgeCases:
             result = get_selected_model()
             assert result == DEFAULT_MODEL
 
-    @pytest.mark.unit
     def test_get_selected_model_invalid_model(self):
         """Should return default if saved model is invalid."""
         with patch('gemini_service.MODEL_CONFIG_FILE') as mock_file:
@@ -118,7 +100,6 @@ class TestModelEdgeCases:
             result = get_selected_model()
             assert result == DEFAULT_MODEL
 
-    @pytest.mark.unit
     def test_save_selected_model_exception(self):
         """Should return False on exception."""
         with patch('gemini_service.MODEL_CONFIG_FILE') as mock_file:
@@ -134,39 +115,50 @@ class TestModelEdgeCases:
 class TestValidateApiKeyEdgeCases:
     """Edge cases for API key validation."""
 
-    @pytest.mark.unit
-    def test_validate_empty_response(self):
+    async def test_validate_empty_response(self, gemini_env):
         """Should return invalid on empty response."""
-        with patch('gemini_service.genai') as mock_genai:
-            mock_model = MagicMock()
-            mock_response = MagicMock()
-            mock_response.text = ""  # Empty response
-            mock_model.generate_content.return_value = mock_response
-            mock_genai.GenerativeModel.return_value = mock_model
-
-            result = validate_api_key("test-key")
-            assert result["valid"] is False
-            assert result["error"] == "empty_response"
-
-    @pytest.mark.unit
-    def test_validate_model_not_found(self):
+        mock_model = gemini_env.GenerativeModel.return_value
+        mock_model.generate_content_async.return_value.text = ""  # Empty response
+
+        result = await validate_api_key("test-key")
+        assert result == {"valid": False, "error": "empty_response"}
+
+    async def test_validate_model_not_found(self, gemini_env):
         """Should return model_not_found error."""
-        with patch('gemini_service.genai') as mock_genai:
-            mock_genai.GenerativeModel.side_effect = Exception("Model not found 404")
+        gemini_env.GenerativeModel.side_effect = Exception("Model not found 404")
 
-            result = validate_api_key("test-key")
-            assert result["valid"] is False
-            assert result["error"] == "model_not_found"
+        result = await validate_api_key("test-key")
+        assert result == {"valid": False, "error": "model_not_found"}
 
-    @pytest.mark.unit
-    def test_validate_unknown_error(self):
+    async def test_validate_unknown_error(self, gemini_env):
         """Should return unknown error message."""
-        with patch('gemini_service.genai') as mock_genai:
-            mock_genai.GenerativeModel.side_effect = Exception("Some unknown error")
+        gemini_env.GenerativeModel.side_effect = Exception("Some unknown error")
 
-            result = validate_api_key("test-key")
-            assert result["valid"] is False
-            assert "Some unknown error" in result["error"]
+        result = await validate_api_key("test-key")
+        assert result == {"valid": False, "error": "Some unknown error"}
+
+
+# ============================================================================
+# Test: Error Classification
+# ============================================================================
+
+class TestClassifyError:
+    """Tests for the shared API error classifier."""
+
+    @pytest.mark.parametrize("error_msg,patterns,expected", [
+        ("Quota Exceeded", None, "rate_limit"),  # case-insensitive
+        ("invalid argument 429", None, "invalid_api_key"),  # priority order
+        ("404 requested resource not found", None, "model_not_found"),
+        ("permission denied 403", None, None),
+        ("something else", None, None),
+        # Chat patterns add "resource", "api key not valid" and permissions
+        ("429 ResourceExhausted", _CHAT_ERROR_PATTERNS, "rate_limit"),
+        ("404 requested resource not found", _CHAT_ERROR_PATTERNS, "rate_limit"),
+        ("permission denied 403", _CHAT_ERROR_PATTERNS, "permission_denied"),
+    ])
+    def test_classify_error(self, error_msg, patterns, expected):
+        """Should return the first matching category in priority order."""
+        assert _classify_error(error_msg, patterns) == expected
 
 
 # ============================================================================
@@ -176,7 +168,6 @@ class TestValidateApiKeyEdgeCases:
 class TestGeminiServiceEdgeCases:
     """Edge cases for GeminiService class."""
 
-    @pytest.mark.unit
     def test_init_model_failure(self):
         """Should handle model initialization failure."""
         with patch('gemini_service.get_api_key', return_value="test-key"):
@@ -187,7 +178,6 @@ class TestGeminiServiceEdgeCases:
                     service = GeminiService()
                     assert service.model is None
 
-    @pytest.mark.unit
     def test_reload_api_key(self):
         """Should reload API key successfully."""
         with patch('gemini_service.get_api_key', return_value=None):
@@ -202,19 +192,15 @@ class TestGeminiServiceEdgeCases:
 
                         assert service.api_key == "new-key"
 
-    @pytest.mark.unit
-    def test_set_model_reinitializes(self):
+    def test_set_model_reinitializes(self, gemini_env):
         """Should reinitialize model when changing."""
-        with patch('gemini_service.get_api_key', return_value="test-key"):
-            with patch('gemini_service.get_selected_model', return_value=DEFAULT_MODEL):
-                with patch('gemini_service.genai') as mock_genai:
-                    mock_genai.GenerativeModel.return_value = MagicMock()
-                    with patch('gemini_service.save_selected_model', return_value=True):
-                        service = GeminiService()
-                        result = service.set_model("gemini-2.5-pro")
+        with patch('gemini_service.save_selected_model', return_value=True):
+            service = GeminiService()
+            result = service.set_model("gemini-2.5-pro")
 
-                        assert result is True
-                        assert service.model_name == "gemini-2.5-pro"
+            assert result is True
+            assert service.model_name == "gemini-2.5-pro"
+            gemini_env.GenerativeModel.assert_called_with("gemini-2.5-pro")
 
 
 # ============================================================================
@@ -224,113 +210,57 @@ class TestGeminiServiceEdgeCases:
 class TestGenerateResponseEdgeCases:
     """Edge cases for generate_response method."""
 
-    @pytest.mark.unit
-    @pytest.mark.asyncio
-    async def test_generate_response_rate_limit(self):
-        """Should handle rate limit error."""
-        with patch('gemini_service.get_api_key', return_value="test-key"):
-            with patch('gemini_service.get_selected_model', return_value=DEFAULT_MODEL):
-                with patch('gemini_service.genai') as mock_genai:
-                    mock_model = MagicMock()
-                    mock_model.start_chat.side_effect = Exception("quota exceeded 429")
-                    mock_genai.GenerativeModel.return_value = mock_model
-
-                    service = GeminiService()
-                    result = await service.generate_response(
-                        "Test", {"signals": []}, "4h"
-                    )
-
-                    assert result["success"] is False
-                    assert result["error"] == "rate_limit"
-
-    @pytest.mark.unit
-    @pytest.mark.asyncio
-    async def test_generate_response_model_not_found(self):
-        """Should handle model not found error."""
-        with patch('gemini_service.get_api_key', return_value="test-key"):
-            with patch('gemini_service.get_selected_model', return_value=DEFAULT_MODEL):
-                with patch('gemini_service.genai') as mock_genai:
-                    mock_model = MagicMock()
-                    mock_model.start_chat.side_effect = Exception("model not found 404")
-                    mock_genai.GenerativeModel.return_value = mock_model
-
-                    service = GeminiService()
-                    result = await service.generate_response(
-                        "Test", {"signals": []}, "4h"
-                    )
-
-                    assert result["success"] is False
-                    assert result["error"] == "model_not_found"
-
-    @pytest.mark.unit
-    @pytest.mark.asyncio
-    async def test_generate_response_permission_denied(self):
-        """Should handle permission denied error."""
-        with patch('gemini_service.get_api_key', return_value="test-key"):
-            with patch('gemini_service.get_selected_model', return_value=DEFAULT_MODEL):
-                with patch('gemini_service.genai') as mock_genai:
-                    mock_model = MagicMock()
-                    mock_model.start_chat.side_effect = Exception("permission denied 403")
-                    mock_genai.GenerativeModel.return_value = mock_model
-
-                    service = GeminiService()
-                    result = await service.generate_response(
-                        "Test", {"signals": []}, "4h"
-                    )
-
-                    assert result["success"] is False
-                    assert result["error"] == "permission_denied"
-
-    @pytest.mark.unit
-    @pytest.mark.asyncio
-    async def test_generate_response_unknown_error(self):
-        """Should handle unknown error."""
-        with patch('gemini_service.get_api_key', return_value="test-key"):
-            with patch('gemini_service.get_selected_model', return_value=DEFAULT_MODEL):
-                with patch('gemini_service.genai') as mock_genai:
-                    mock_model = MagicMock()
-                    mock_model.start_chat.side_effect = Exception("random error xyz")
-                    mock_genai.GenerativeModel.return_value = mock_model
-
-                    service = GeminiService()
-                    result = await service.generate_response(
-                        "Test", {"signals": []}, "4h"
-                    )
-
-                    assert result["success"] is False
-                    assert result["error"] == "unknown"
-
-    @pytest.mark.unit
-    @pytest.mark.asyncio
-    async def test_generate_response_with_history(self):
-        """Should include conversation history."""
-        with patch('gemini_service.get_api_key', return_value="test-key"):
-            with patch('gemini_service.get_selected_model', return_value=DEFAULT_MODEL):
-                with patch('gemini_service.genai') as mock_genai:
-                    mock_chat = MagicMock()
-                    mock_response = MagicMock()
-                    mock_response.text = "Response with history"
-                    mock_chat.send_message.return_value = mock_response
-
-                    mock_model = MagicMock()
-                    mock_model.start_chat.return_value = mock_chat
-                    mock_genai.GenerativeModel.return_value = mock_model
-
-                    service = GeminiService()
-
-                    history = [
-                        {"role": "user", "content": "Hello"},
-                        {"role": "assistant", "content": "Hi there!"}
-                    ]
-
-                    result = await service.generate_response(
-                        "Follow up question",
-                        {"signals": []},
-                        "4h",
-                        conversation_history=history
-                    )
-
-                    assert result["success"] is True
+    @pytest.mark.parametrize("exc_msg,expected", [
+        ("quota exceeded 429", "rate_limit"),
+        ("model not found 404", "model_not_found"),
+        ("permission denied 403", "permission_denied"),
+        ("random error xyz", "unknown"),
+    ])
+    async def test_generate_response_errors(self, configured_service, exc_msg, expected):
+        """Should map API errors to their error codes."""
+        configured_service.model.start_chat.side_effect = Exception(exc_msg)
+
+        result = await configured_service.generate_response(
+            "Test", {"signals": []}, "4h"
+        )
+
+        assert result == {"success": False, "response": ANY, "error": expected}
+
+    async def test_generate_response_with_history(self, configured_service, canned_response):
+        """Should pass mapped conversation history to the chat session."""
+        mock_chat = configured_service.model.start_chat.return_value
+        mock_chat.send_message_async.return_value = canned_response
+
+        history = [
+            {"role": "user", "content": "Hello"},
+            {"role": "assistant", "content": "Hi there!"}
+        ]
+
+        without_history, with_history = await asyncio.gather(
+            configured_service.generate_response(
+                "First question", {"signals": []}, "4h"
+            ),
+            configured_service.generate_response(
+                "Follow up question",
+                {"signals": []},
+                "4h",
+                conversation_history=history
+            ),
+        )
+
+        expected = {"success": True, "response": canned_response.text, "error": None}
+        assert without_history == with_history == expected
+        histories = [
+            c.kwargs["history"] for c in configured_service.model.start_chat.call_args_list
+        ]
+        assert histories == [
+            [],
+            [
+                {"role": "user", "parts": ["Hello"]},
+                {"role": "model", "parts": ["Hi there!"]}
+            ]
+        ]
+        assert mock_chat.send_message_async.await_count == 2
 
 
 # ============================================================================
@@ -340,53 +270,16 @@ class TestGenerateResponseEdgeCases:
 class TestFundamentalAnalysisEdgeCases:
     """Edge cases for fundamental analysis."""
 
-    @pytest.mark.unit
-    @pytest.mark.asyncio
-    async def test_fundamental_rate_limit(self):
-        """Should handle rate limit in fundamental analysis."""
-        with patch('gemini_service.get_api_key', return_value="test-key"):
-            with patch('gemini_service.get_selected_model', return_value=DEFAULT_MODEL):
-                with patch('gemini_service.genai') as mock_genai:
-                    mock_model = MagicMock()
-                    mock_model.generate_content.side_effect = Exception("rate limit 429")
-                    mock_genai.GenerativeModel.return_value = mock_model
-
-                    service = GeminiService()
-                    result = await service.generate_fundamental_analysis("BTCUSDT")
-
-                    assert result["success"] is False
-                    assert result["error"] == "rate_limit"
-
-    @pytest.mark.unit
-    @pytest.mark.asyncio
-    async def test_fundamental_model_not_found(self):
-        """Should handle model not found in fundamental analysis."""
-        with patch('gemini_service.get_api_key', return_value="test-key"):
-            with patch('gemini_service.get_selected_model', return_value=DEFAULT_MODEL):
-                with patch('gemini_service.genai') as mock_genai:
-                    mock_model = MagicMock()
-                    mock_model.generate_content.side_effect = Exception("not found 404")
-                    mock_genai.GenerativeModel.return_value = mock_model
-
-                    service = GeminiService()
-                    result = await service.generate_fundamental_analysis("BTCUSDT")
-
-                    assert result["success"] is False
-                    assert result["error"] == "model_not_found"
+    @pytest.mark.parametrize("exc_msg,expected", [
+        ("rate limit 429", "rate_limit"),
+        ("not found 404", "model_not_found"),
+        ("404 requested resource not found", "model_not_found"),
+        ("random error", "unknown"),
+    ])
+    async def test_fundamental_errors(self, configured_service, exc_msg, expected):
+        """Should map API errors to their error codes in fundamental analysis."""
+        configured_service.model.generate_content_async.side_effect = Exception(exc_msg)
 
-    @pytest.mark.unit
-    @pytest.mark.asyncio
-    async def test_fundamental_unknown_error(self):
-        """Should handle unknown error in fundamental analysis."""
-        with patch('gemini_service.get_api_key', return_value="test-key"):
-            with patch('gemini_service.get_selected_model', return_value=DEFAULT_MODEL):
-                with patch('gemini_service.genai') as mock_genai:
-                    mock_model = MagicMock()
-                    mock_model.generate_content.side_effect = Exception("random error")
-                    mock_genai.GenerativeModel.return_value = mock_model
-
-                    service = GeminiService()
-                    result = await service.generate_fundamental_analysis("BTCUSDT")
+        result = await configured_service.generate_fundamental_analysis("BTCUSDT")
 
-                    assert result["success"] is False
-                    assert result["error"] == "unknown"
+        assert result == {"success": False, "response": ANY, "error": expected}
@@ -3,23 +3,19 @@ Unit tests for indicators.py - Pure function tests
 """
 import pytest
 import numpy as np
-import pandas as pd
-from typing import List
-
-# Import the module under test
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from indicators import (
     calculate_ema,
+    calculate_ema_pair,
     calculate_rma,
     calculate_rsi,
     calculate_smoothed_rsi,
+    smooth_rsi,
     calculate_atr,
     check_divergence,
     detect_signal_layer,
-    get_rsi_category
+    EMAState,
+    RSIState,
 )
 
 @pytest.fixture
@@ -30,6 +26,153 @@ def sample_highs(sample_prices):
 def sample_lows(sample_prices):
     return [p * 0.99 for p in sample_prices]
 
+# ============================================================================
+# Test: single-pass kernels match the pandas ewm reference
+# ============================================================================
+
+@pytest.fixture
+def pd():
+    """pandas, imported only by the reference tests that need it."""
+    return pytest.importorskip("pandas")
+
+
+class TestMatchesPandasReference:
+    """The loop kernels must reproduce the pandas ewm results exactly."""
+
+    @pytest.mark.unit
+    def test_ema_matches_pandas(self, pd, sample_prices):
+        expected = pd.Series(sample_prices).ewm(span=13, adjust=False).mean()
+        np.testing.assert_array_equal(calculate_ema(sample_prices, 13), expected)
+
+    @pytest.mark.unit
+    def test_rsi_matches_pandas(self, pd, sample_prices):
+        change = pd.Series(sample_prices).diff()
+        avg_gain = change.where(change > 0, 0.0).ewm(alpha=1 / 14, adjust=False).mean()
+        avg_loss = (-change).where(change < 0, 0.0).ewm(alpha=1 / 14, adjust=False).mean()
+        expected = 100 - 100 / (1 + avg_gain / avg_loss)
+
+        rsi = calculate_rsi(sample_prices, 14)
+        assert np.isnan(rsi[:14]).all()
+        np.testing.assert_array_equal(rsi[14:], expected[14:])
+
+    @pytest.mark.unit
+    def test_atr_matches_pandas(self, pd, sample_prices, sample_highs, sample_lows):
+        df = pd.DataFrame({'high': sample_highs, 'low': sample_lows, 'close': sample_prices})
+        prev_close = df['close'].shift(1)
+        tr = pd.concat([
+            df['high'] - df['low'],
+            (df['high'] - prev_close).abs(),
+            (df['low'] - prev_close).abs(),
+        ], axis=1).max(axis=1)
+        expected = tr.ewm(alpha=1 / 14, adjust=False).mean()
+        np.testing.assert_array_equal(calculate_atr(sample_highs, sample_lows, sample_prices, 14), expected)
+
+    @pytest.mark.unit
+    def test_interior_nan_matches_pandas(self, pd, sample_prices):
+        """A NaN after the warm-up decays the average's weight, as in pandas."""
+        prices = list(sample_prices)
+        prices[0] = prices[20] = prices[21] = np.nan
+        highs = [p * 1.01 for p in prices]
+        lows = [p * 0.99 for p in prices]
+        series = pd.Series(prices)
+
+        np.testing.assert_array_equal(calculate_ema(prices, 13), series.ewm(span=13, adjust=False).mean())
+        np.testing.assert_array_equal(calculate_ema_pair(prices, 13, 21)[1], series.ewm(span=21, adjust=False).mean())
+        np.testing.assert_array_equal(calculate_rma(prices, 14), series.ewm(alpha=1 / 14, adjust=False).mean())
+
+        df = pd.DataFrame({'high': highs, 'low': lows, 'close': prices})
+        prev_close = df['close'].shift(1)
+        tr = pd.concat([
+            df['high'] - df['low'],
+            (df['high'] - prev_close).abs(),
+            (df['low'] - prev_close).abs(),
+        ], axis=1).max(axis=1)
+        np.testing.assert_array_equal(
+            calculate_atr(highs, lows, prices, 14), tr.ewm(alpha=1 / 14, adjust=False).mean()
+        )
+
+    @pytest.mark.unit
+    def test_rma_accepts_plain_arrays(self, pd, sample_prices):
+        expected = pd.Series(sample_prices).ewm(alpha=1 / 14, adjust=False).mean().tolist()
+        for values in (np.array(sample_prices), sample_prices, pd.Series(sample_prices)):
+            np.testing.assert_array_equal(calculate_rma(values, 14), expected)
+
+# ============================================================================
+# Test: RSI on trending / ranging series
+# ============================================================================
+
+class TestRSITrends:
+    """RSI extremes on the shared trend fixtures."""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("fixture_name, low, high", [
+        ("sample_uptrend_prices", 100.0, 100.0),
+        ("sample_downtrend_prices", 0.0, 0.0),
+        ("sample_sideways_prices", 40.0, 60.0),
+    ])
+    def test_final_rsi(self, request, fixture_name, low, high):
+        prices = request.getfixturevalue(fixture_name)
+        assert low <= calculate_rsi(prices, 14)[-1] <= high
+
+# ============================================================================
+# Test: fused EMA pair / RSI smoothing
+# ============================================================================
+
+class TestFusedIndicators:
+    """Fused helpers must match the separate calls they replace."""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("length", [10, 15, 50])
+    def test_ema_pair_matches_separate_calls(self, sample_prices, length):
+        prices = sample_prices[:length]
+        ema13, ema21 = calculate_ema_pair(prices, 13, 21)
+        np.testing.assert_array_equal(ema13, calculate_ema(prices, 13))
+        np.testing.assert_array_equal(ema21, calculate_ema(prices, 21))
+
+    @pytest.mark.unit
+    def test_smooth_rsi_matches_smoothed_rsi(self, sample_prices):
+        rsi = calculate_rsi(sample_prices, 14)
+        np.testing.assert_array_equal(
+            smooth_rsi(rsi, 9),
+            calculate_smoothed_rsi(sample_prices, 14, 9)
+        )
+
+# ============================================================================
+# Test: EMAState / RSIState
+# ============================================================================
+
+class TestStreamingState:
+    """Incremental indicators must track the batch functions bar for bar."""
+
+    @pytest.mark.unit
+    def test_ema_state_matches_batch(self, sample_prices):
+        state = EMAState(13)
+        streamed = np.array([state.update(p) for p in sample_prices])
+        # Each streamed value is the last EMA of the prices seen so far
+        expected = np.array([
+            calculate_ema(sample_prices[:i + 1], 13)[-1]
+            for i in range(len(sample_prices))
+        ])
+        np.testing.assert_array_equal(streamed, expected)
+
+    @pytest.mark.unit
+    def test_rsi_state_matches_batch(self, sample_prices):
+        state = RSIState(14)
+        streamed = np.array([state.update(p) for p in sample_prices])
+        np.testing.assert_array_equal(streamed, calculate_rsi(sample_prices, 14))
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("prices, expected", [
+        ([100.0 + i for i in range(20)], 100.0),
+        ([100.0] * 20, 50.0),
+        ([200.0 - i for i in range(20)], 0.0),
+    ])
+    def test_rsi_state_edge_cases(self, prices, expected):
+        state = RSIState(14)
+        for p in prices:
+            last = state.update(p)
+        assert last == expected
+
 # ============================================================================
 # Test: calculate_atr
 # ============================================================================
@@ -39,11 +182,12 @@ class TestCalculateATR:
     
     @pytest.mark.unit
     def test_atr_calculation(self, sample_prices, sample_highs, sample_lows):
-        atr = calculate_atr(sample_highs, sample_lows, sample_prices, period=14)
+        atr = np.asarray(calculate_atr(sample_highs, sample_lows, sample_prices, period=14))
         assert len(atr) == len(sample_prices)
         # ATR should be positive
-        valid_atr = [a for a in atr if not np.isnan(a)]
-        assert all(a > 0 for a in valid_atr)
+        valid_atr = atr[~np.isnan(atr)]
+        assert valid_atr.size > 0
+        assert (valid_atr > 0).all()
 
 # ============================================================================
 # Test: check_divergence
@@ -53,9 +197,9 @@ class TestCheckDivergence:
     """Tests for divergence detection."""
     
     @pytest.mark.unit
-    def test_check_divergence_returns_none_or_str(self, sample_prices, sample_highs, sample_lows):
-        rsi = calculate_rsi(sample_prices, period=14)
-        result = check_divergence(sample_highs, sample_lows, sample_prices, rsi)
+    def test_check_divergence_returns_none_or_str(self, sample_indicators):
+        ind = sample_indicators
+        result = check_divergence(ind.high, ind.low, ind.close, ind.rsi14)
         assert result is None or isinstance(result, str)
 
 # ============================================================================
@@ -66,16 +210,11 @@ class TestDetectSignalLayer:
     """Tests for signal layer detection."""
 
     @pytest.mark.unit
-    def test_signal_layer_structure(self, sample_prices, sample_highs, sample_lows):
-        ema_13 = calculate_ema(sample_prices, period=13)
-        ema_21 = calculate_ema(sample_prices, period=21)
-        rsi_14 = calculate_rsi(sample_prices, period=14)
-        smoothed_rsi = calculate_smoothed_rsi(sample_prices, rsi_period=14, smooth_period=9)
-        atr = calculate_atr(sample_highs, sample_lows, sample_prices, period=14)
-
+    def test_signal_layer_structure(self, sample_indicators):
+        ind = sample_indicators
         result = detect_signal_layer(
-            sample_highs, sample_lows, sample_prices,
-            ema_13, ema_21, rsi_14, smoothed_rsi, atr
+            ind.high, ind.low, ind.close,
+            ind.ema13, ind.ema21, ind.rsi14, ind.srsi, ind.atr
         )
 
         assert 'long_layer' in result
@@ -4,12 +4,11 @@ Extended tests for indicators.py to achieve 90%+ coverage
 These tests cover edge cases and all signal layer branches.
 """
 import pytest
-import pandas as pd
 import numpy as np
 from indicators import (
-    calculate_ema, calculate_rsi, calculate_smoothed_rsi,
+    calculate_ema_pair, calculate_rsi, smooth_rsi,
     calculate_atr, detect_signal_layer, check_divergence,
-    get_rsi_category
+    get_rsi_category, get_rsi_categories
 )
 
 
@@ -18,154 +17,113 @@ from indicators import (
 # ============================================================================
 
 def generate_ohlc_from_close(close_prices, volatility=0.02):
-    """Helper to generate high/low from close prices."""
-    high = [p * (1 + volatility) for p in close_prices]
-    low = [p * (1 - volatility) for p in close_prices]
-    return high, low, close_prices
+    """Helper to generate high/low (as float64 arrays) from close prices."""
+    close = np.asarray(close_prices, dtype=np.float64)
+    return close * (1 + volatility), close * (1 - volatility), close
+
+
+def signal_layer_for(close_prices):
+    """Run the full indicator pipeline on a close series and detect its layers."""
+    # Same steps as the heatmap loop in main.py
+    high, low, close = generate_ohlc_from_close(close_prices)
+    ema_13, ema_21 = calculate_ema_pair(close, 13, 21)
+    rsi = calculate_rsi(close, 14)
+    smoothed_rsi = smooth_rsi(rsi, 9)
+    atr = calculate_atr(high, low, close, 14)
+    return detect_signal_layer(high, low, close, ema_13, ema_21, rsi, smoothed_rsi, atr)
+
+
+# Close series for the signal layer tests, built once at import as float64
+# so the indicators use them without converting
+LAYER5_LONG_CLOSE = np.array([
+    100, 98, 96, 94, 92, 90, 88, 86, 84, 82,
+    80, 78, 76, 74, 72, 70, 68, 66, 64, 62,
+    60, 58, 56, 54, 52, 50, 48, 46, 44, 42,
+    40, 38, 36, 34, 32, 30, 28, 26, 24, 22,
+    20, 22, 24, 26, 28, 30, 32, 34, 36, 38,
+], dtype=np.float64)
+LAYER5_SHORT_CLOSE = np.array([
+    20, 22, 24, 26, 28, 30, 32, 34, 36, 38,
+    40, 42, 44, 46, 48, 50, 52, 54, 56, 58,
+    60, 62, 64, 66, 68, 70, 72, 74, 76, 78,
+    80, 82, 84, 86, 88, 90, 92, 94, 96, 98,
+    100, 98, 96, 94, 92, 90, 88, 86, 84, 82,
+], dtype=np.float64)
+LAYER4_CLOSE = np.concatenate([np.arange(100, 50, -1), np.arange(50, 60)]).astype(np.float64)
+LAYER3_CLOSE = np.concatenate([np.full(30, 50), np.arange(50, 30, -1), np.arange(30, 40)]).astype(np.float64)
+LAYER2_CLOSE = np.concatenate([np.full(20, 50), np.arange(50, 25, -1), [26, 27, 28]]).astype(np.float64)
+LAYER1_CLOSE = np.array([
+    50, 51, 52, 53, 54, 55, 56, 57, 58, 59,
+    60, 59, 58, 57, 56, 55, 54, 53, 52, 51,
+    50, 51, 52, 53, 54, 55, 56, 57, 58, 59,
+    60, 61, 62, 63, 64, 65, 66, 67, 68, 69,
+    70, 71, 72, 73, 74, 75, 76, 77, 78, 79,
+], dtype=np.float64)
+NEUTRAL_CLOSE = 50.0 + np.arange(60) % 5
+
+
+# One close series per signal-layer branch, keyed by test id
+LAYER_CASES = {
+    # Long decline, then uptick (bullish reversal)
+    "layer5_long": LAYER5_LONG_CLOSE,
+    # Long rise, then downtick (bearish reversal)
+    "layer5_short": LAYER5_SHORT_CLOSE,
+    "layer4": LAYER4_CLOSE,
+    # RSI + Smoothed RSI cross only
+    "layer3": LAYER3_CLOSE,
+    # RSI + divergence only
+    "layer2": LAYER2_CLOSE,
+    # EMA cross only
+    "layer1_ema_only": LAYER1_CLOSE,
+    # Neutral market, might have no strong signals
+    "neutral": NEUTRAL_CLOSE,
+}
 
 
 class TestSignalLayerAllLayers:
     """Tests to cover all signal layer branches."""
 
     @pytest.mark.unit
-    def test_layer5_long_signal(self):
-        """Test Layer 5 LONG signal conditions."""
-        # Start with declining prices, then uptick (bullish reversal)
-        close = [100, 98, 96, 94, 92, 90, 88, 86, 84, 82,
-                 80, 78, 76, 74, 72, 70, 68, 66, 64, 62,
-                 60, 58, 56, 54, 52, 50, 48, 46, 44, 42,
-                 40, 38, 36, 34, 32, 30, 28, 26, 24, 22,
-                 20, 22, 24, 26, 28, 30, 32, 34, 36, 38]
+    @pytest.mark.parametrize("close_prices", list(LAYER_CASES.values()), ids=list(LAYER_CASES))
+    def test_layer_detection(self, close_prices):
+        """Test each scenario yields a valid layer result."""
+        result = signal_layer_for(close_prices)
 
-        high, low, close = generate_ohlc_from_close(close)
-        ema_13 = calculate_ema(close, 13)
-        ema_21 = calculate_ema(close, 21)
-        rsi = calculate_rsi(close, 14)
-        smoothed_rsi = calculate_smoothed_rsi(close, 14, 9)
-        atr = calculate_atr(high, low, close, 14)
-
-        result = detect_signal_layer(high, low, close, ema_13, ema_21, rsi, smoothed_rsi, atr)
-
-        # Should return valid structure
-        assert 'long_layer' in result
-        assert 'short_layer' in result
         assert isinstance(result['long_layer'], int)
         assert isinstance(result['short_layer'], int)
-
-    @pytest.mark.unit
-    def test_layer5_short_signal(self):
-        """Test Layer 5 SHORT signal conditions."""
-        # Start with rising prices, then downtick (bearish reversal)
-        close = [20, 22, 24, 26, 28, 30, 32, 34, 36, 38,
-                 40, 42, 44, 46, 48, 50, 52, 54, 56, 58,
-                 60, 62, 64, 66, 68, 70, 72, 74, 76, 78,
-                 80, 82, 84, 86, 88, 90, 92, 94, 96, 98,
-                 100, 98, 96, 94, 92, 90, 88, 86, 84, 82]
-
-        high, low, close = generate_ohlc_from_close(close)
-        ema_13 = calculate_ema(close, 13)
-        ema_21 = calculate_ema(close, 21)
-        rsi = calculate_rsi(close, 14)
-        smoothed_rsi = calculate_smoothed_rsi(close, 14, 9)
-        atr = calculate_atr(high, low, close, 14)
-
-        result = detect_signal_layer(high, low, close, ema_13, ema_21, rsi, smoothed_rsi, atr)
-
-        assert 'long_layer' in result
-        assert 'short_layer' in result
-
-    @pytest.mark.unit
-    def test_layer4_conditions(self):
-        """Test Layer 4 signal conditions."""
-        close = list(range(100, 50, -1)) + list(range(50, 60))
-
-        high, low, close = generate_ohlc_from_close(close)
-        ema_13 = calculate_ema(close, 13)
-        ema_21 = calculate_ema(close, 21)
-        rsi = calculate_rsi(close, 14)
-        smoothed_rsi = calculate_smoothed_rsi(close, 14, 9)
-        atr = calculate_atr(high, low, close, 14)
-
-        result = detect_signal_layer(high, low, close, ema_13, ema_21, rsi, smoothed_rsi, atr)
-
-        assert result['long_layer'] >= 0
-        assert result['short_layer'] >= 0
-
-    @pytest.mark.unit
-    def test_layer3_conditions(self):
-        """Test Layer 3 signal conditions (RSI + Smoothed RSI cross only)."""
-        close = [50] * 30 + list(range(50, 30, -1)) + list(range(30, 40))
-
-        high, low, close = generate_ohlc_from_close(close)
-        ema_13 = calculate_ema(close, 13)
-        ema_21 = calculate_ema(close, 21)
-        rsi = calculate_rsi(close, 14)
-        smoothed_rsi = calculate_smoothed_rsi(close, 14, 9)
-        atr = calculate_atr(high, low, close, 14)
-
-        result = detect_signal_layer(high, low, close, ema_13, ema_21, rsi, smoothed_rsi, atr)
-
-        assert 'long_layer' in result
-
-    @pytest.mark.unit
-    def test_layer2_conditions(self):
-        """Test Layer 2 signal conditions (RSI + divergence only)."""
-        close = [50] * 20 + list(range(50, 25, -1)) + [26, 27, 28]
-
-        high, low, close = generate_ohlc_from_close(close)
-        ema_13 = calculate_ema(close, 13)
-        ema_21 = calculate_ema(close, 21)
-        rsi = calculate_rsi(close, 14)
-        smoothed_rsi = calculate_smoothed_rsi(close, 14, 9)
-        atr = calculate_atr(high, low, close, 14)
-
-        result = detect_signal_layer(high, low, close, ema_13, ema_21, rsi, smoothed_rsi, atr)
-
-        assert result['long_layer'] >= 0
-
-    @pytest.mark.unit
-    def test_layer1_ema_only(self):
-        """Test Layer 1 signal conditions (EMA cross only)."""
-        close = [50, 51, 52, 53, 54, 55, 56, 57, 58, 59,
-                 60, 59, 58, 57, 56, 55, 54, 53, 52, 51,
-                 50, 51, 52, 53, 54, 55, 56, 57, 58, 59,
-                 60, 61, 62, 63, 64, 65, 66, 67, 68, 69,
-                 70, 71, 72, 73, 74, 75, 76, 77, 78, 79]
-
-        high, low, close = generate_ohlc_from_close(close)
-        ema_13 = calculate_ema(close, 13)
-        ema_21 = calculate_ema(close, 21)
-        rsi = calculate_rsi(close, 14)
-        smoothed_rsi = calculate_smoothed_rsi(close, 14, 9)
-        atr = calculate_atr(high, low, close, 14)
-
-        result = detect_signal_layer(high, low, close, ema_13, ema_21, rsi, smoothed_rsi, atr)
-
-        assert result['long_layer'] >= 0 or result['short_layer'] >= 0
-
-    @pytest.mark.unit
-    def test_no_signal_neutral_market(self):
-        """Test no signal in neutral market conditions."""
-        close = [50 + (i % 5) for i in range(60)]
-
-        high, low, close = generate_ohlc_from_close(close)
-        ema_13 = calculate_ema(close, 13)
-        ema_21 = calculate_ema(close, 21)
-        rsi = calculate_rsi(close, 14)
-        smoothed_rsi = calculate_smoothed_rsi(close, 14, 9)
-        atr = calculate_atr(high, low, close, 14)
-
-        result = detect_signal_layer(high, low, close, ema_13, ema_21, rsi, smoothed_rsi, atr)
-
-        # In neutral conditions, might have no strong signals
-        assert result['long_layer'] >= 0
-        assert result['short_layer'] >= 0
+        assert 0 <= result['long_layer'] <= 5
+        assert 0 <= result['short_layer'] <= 5
 
 
 # ============================================================================
 # Test: Divergence Detection - Actual Divergences
 # ============================================================================
 
+# Close series for the divergence tests, stitched from ramps once at import.
+# After the first 20 bars each swing repeats, so the tail is a tiled cycle.
+DIVERGENCE_BULL_CLOSE = np.concatenate([
+    np.arange(50, 38, -2), np.arange(42, 52, 2),   # 50 -> 40 -> 50
+    np.arange(48, 40, -2), np.arange(38, 48, 2),   # 48 -> 42, 38 -> 46
+    np.tile(np.concatenate([
+        np.arange(48, 62, 2), np.arange(58, 40, -2),  # 48 -> 60 -> 42
+        np.arange(44, 52, 2), np.arange(48, 36, -2),  # 44 -> 50 -> 38
+        np.arange(40, 48, 2),                         # 40 -> 46
+    ]), 2),
+]).astype(np.float64)
+DIVERGENCE_BEAR_CLOSE = np.concatenate([
+    np.arange(50, 62, 2), np.arange(58, 50, -2),   # 50 -> 60 -> 52
+    np.arange(50, 60, 2), np.arange(62, 52, -2),   # 50 -> 58, 62 -> 54
+    np.tile(np.concatenate([
+        np.arange(52, 38, -2), np.arange(42, 60, 2),  # 52 -> 40 -> 58
+        np.arange(56, 48, -2), np.arange(52, 64, 2),  # 56 -> 50 -> 62
+        np.arange(60, 52, -2),                        # 60 -> 54
+    ]), 2),
+]).astype(np.float64)
+DIVERGENCE_RISE_FALL_CLOSE = np.concatenate([
+    np.arange(50, 100), np.arange(100, 50, -1), np.arange(50, 80)
+]).astype(np.float64)
+
+
 class TestDivergenceActual:
     """Tests for actual divergence detection using check_divergence API."""
 
@@ -173,16 +131,7 @@ class TestDivergenceActual:
     def test_bullish_regular_divergence(self):
         """Test detection of bullish regular divergence."""
         # Create enough data for divergence detection (needs range_upper + lookback + buffer)
-        close = [50, 48, 46, 44, 42, 40, 42, 44, 46, 48,
-                 50, 48, 46, 44, 42, 38, 40, 42, 44, 46,
-                 48, 50, 52, 54, 56, 58, 60, 58, 56, 54,
-                 52, 50, 48, 46, 44, 42, 44, 46, 48, 50,
-                 48, 46, 44, 42, 40, 38, 40, 42, 44, 46,
-                 48, 50, 52, 54, 56, 58, 60, 58, 56, 54,
-                 52, 50, 48, 46, 44, 42, 44, 46, 48, 50,
-                 48, 46, 44, 42, 40, 38, 40, 42, 44, 46]
-
-        high, low, close = generate_ohlc_from_close(close)
+        high, low, close = generate_ohlc_from_close(DIVERGENCE_BULL_CLOSE)
         rsi = calculate_rsi(close, 14)
 
         # check_divergence returns Optional[str]: 'bullish_regular', 'bearish_regular', or None
@@ -194,16 +143,7 @@ class TestDivergenceActual:
     @pytest.mark.unit
     def test_bearish_regular_divergence(self):
         """Test detection of bearish regular divergence."""
-        close = [50, 52, 54, 56, 58, 60, 58, 56, 54, 52,
-                 50, 52, 54, 56, 58, 62, 60, 58, 56, 54,
-                 52, 50, 48, 46, 44, 42, 40, 42, 44, 46,
-                 48, 50, 52, 54, 56, 58, 56, 54, 52, 50,
-                 52, 54, 56, 58, 60, 62, 60, 58, 56, 54,
-                 52, 50, 48, 46, 44, 42, 40, 42, 44, 46,
-                 48, 50, 52, 54, 56, 58, 56, 54, 52, 50,
-                 52, 54, 56, 58, 60, 62, 60, 58, 56, 54]
-
-        high, low, close = generate_ohlc_from_close(close)
+        high, low, close = generate_ohlc_from_close(DIVERGENCE_BEAR_CLOSE)
         rsi = calculate_rsi(close, 14)
 
         result = check_divergence(high, low, close, rsi)
@@ -227,9 +167,7 @@ class TestDivergenceActual:
     def test_divergence_with_adequate_data(self):
         """Test divergence detection with adequate data."""
         # Generate longer price series for proper divergence detection
-        close = list(range(50, 100)) + list(range(100, 50, -1)) + list(range(50, 80))
-
-        high, low, close = generate_ohlc_from_close(close)
+        high, low, close = generate_ohlc_from_close(DIVERGENCE_RISE_FALL_CLOSE)
         rsi = calculate_rsi(close, 14)
 
         result = check_divergence(high, low, close, rsi)
@@ -238,45 +176,74 @@ class TestDivergenceActual:
         assert result is None or isinstance(result, str)
 
 
+    @pytest.mark.unit
+    @pytest.mark.parametrize("seed, expected", [
+        (46, 'bullish_regular'),
+        (53, 'bearish_regular'),
+        (0, None),
+    ])
+    def test_end_matches_sliced_series(self, seed, expected):
+        """`end` should give the same result as slicing every series to it."""
+        rng = np.random.default_rng(seed)
+        close = (100 + np.cumsum(rng.normal(size=120))).round(2).tolist()
+        high, low, close = generate_ohlc_from_close(close)
+        rsi = calculate_rsi(close, 14)
+
+        sliced = check_divergence(high[:-1], low[:-1], close[:-1], rsi[:-1])
+        assert check_divergence(high, low, close, rsi, end=len(close) - 1) == sliced == expected
+
+    @pytest.mark.unit
+    def test_zero_lookback_still_checks_bearish(self):
+        """With zero lookbacks every bar is both pivot kinds; bearish must still be found."""
+        # Rising highs/lows with falling RSI: no bullish, regular bearish divergence
+        high = np.linspace(100, 180, 80)
+        low = high - 1
+        rsi = np.linspace(80, 40, 80)
+
+        result = check_divergence(high, low, high - 0.5, rsi, lookback_left=0, lookback_right=0)
+
+        assert result == 'bearish_regular'
+
 # ============================================================================
 # Test: RSI Category - Additional Edge Cases
 # ============================================================================
 
-class TestRSICategoryEdgeCases:
-    """Additional edge case tests for RSI categorization."""
-
-    @pytest.mark.unit
-    def test_boundary_70(self):
-        """Test exact boundary at 70."""
-        assert get_rsi_category(70.0) == 'OVERBOUGHT'
-        assert get_rsi_category(69.99) == 'STRONG'
+RSI_BOUNDARY_CASES = [
+    # Each bound is inclusive on the upper category
+    (70.0, 'OVERBOUGHT'),
+    (69.99, 'STRONG'),
+    (60.0, 'STRONG'),
+    (59.99, 'NEUTRAL'),
+    (40.0, 'NEUTRAL'),
+    (39.99, 'WEAK'),
+    (30.0, 'WEAK'),
+    (29.99, 'OVERSOLD'),
+    # Out of range (invalid but should handle)
+    (-10, 'OVERSOLD'),
+    (110, 'OVERBOUGHT'),
+]
 
-    @pytest.mark.unit
-    def test_boundary_60(self):
-        """Test exact boundary at 60."""
-        assert get_rsi_category(60.0) == 'STRONG'
-        assert get_rsi_category(59.99) == 'NEUTRAL'
 
-    @pytest.mark.unit
-    def test_boundary_40(self):
-        """Test exact boundary at 40."""
-        assert get_rsi_category(40.0) == 'NEUTRAL'
-        assert get_rsi_category(39.99) == 'WEAK'
+class TestRSICategoryEdgeCases:
+    """Additional edge case tests for RSI categorization."""
 
     @pytest.mark.unit
-    def test_boundary_30(self):
-        """Test exact boundary at 30."""
-        assert get_rsi_category(30.0) == 'WEAK'
-        assert get_rsi_category(29.99) == 'OVERSOLD'
+    @pytest.mark.parametrize("rsi, expected", RSI_BOUNDARY_CASES)
+    def test_category_boundaries(self, rsi, expected):
+        """Test categorization at and around each boundary."""
+        assert get_rsi_category(rsi) == expected
 
     @pytest.mark.unit
-    def test_negative_rsi(self):
-        """Test negative RSI (invalid but should handle)."""
-        result = get_rsi_category(-10)
-        assert result == 'OVERSOLD'
+    def test_categories_vectorized(self):
+        """Test the array form agrees with the scalar one, NaN included."""
+        values, expected = zip(*RSI_BOUNDARY_CASES)
+        np.testing.assert_array_equal(
+            get_rsi_categories(values + (np.nan,)),
+            list(expected) + ['NEUTRAL']
+        )
 
     @pytest.mark.unit
-    def test_rsi_over_100(self):
-        """Test RSI over 100 (invalid but should handle)."""
-        result = get_rsi_category(110)
-        assert result == 'OVERBOUGHT'
+    @pytest.mark.parametrize("rsi", [float('nan'), np.nan, None])
+    def test_missing_rsi_is_neutral(self, rsi):
+        """Test NaN/None RSI (warm-up bars) is reported as NEUTRAL."""
+        assert get_rsi_category(rsi) == 'NEUTRAL'
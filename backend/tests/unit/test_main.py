@@ -4,24 +4,7 @@ Unit tests for FastAPI main.py endpoints
 Tests API endpoints with mocked dependencies.
 """
 import pytest
-from unittest.mock import patch, MagicMock, AsyncMock
-from fastapi.testclient import TestClient
-import json
-
-# We need to mock external dependencies before importing main
-with patch('main.GeminiService'):
-    with patch('main.CacheManager'):
-        from main import app
-
-
-# ============================================================================
-# Test Client Fixture
-# ============================================================================
-
-@pytest.fixture
-def client():
-    """Create test client."""
-    return TestClient(app)
+from unittest.mock import patch
 
 
 # ============================================================================
@@ -208,21 +191,17 @@ class TestHeatmap:
             assert response.headers.get("X-Cache") == "HIT"
 
     @pytest.mark.unit
-    def test_heatmap_no_symbols(self, client):
+    def test_heatmap_no_symbols(self, client, heatmap_fetcher):
         """Should handle empty symbols list."""
+        heatmap_fetcher(symbols=[])
+
         with patch('main.cache_manager') as mock_cache:
             mock_cache.get_cache.return_value = None
-            with patch('main.CryptoDataFetcher') as mock_fetcher_class:
-                mock_fetcher = AsyncMock()
-                mock_fetcher.get_top_symbols.return_value = []
-                mock_fetcher.__aenter__.return_value = mock_fetcher
-                mock_fetcher.__aexit__.return_value = None
-                mock_fetcher_class.return_value = mock_fetcher
-
-                response = client.get("/api/heatmap?timeframe=4h")
-                assert response.status_code == 200
-                data = response.json()
-                assert data["success"] is False
+
+            response = client.get("/api/heatmap?timeframe=4h")
+            assert response.status_code == 200
+            data = response.json()
+            assert data["success"] is False
 
 
 # ============================================================================
@@ -274,16 +253,14 @@ class TestPydanticModels:
     """Tests for request/response models."""
 
     @pytest.mark.unit
-    def test_chat_request_defaults(self):
+    def test_chat_request_defaults(self, app_module):
         """ChatRequest should have correct defaults."""
-        from main import ChatRequest
-        req = ChatRequest(message="test")
+        req = app_module.ChatRequest(message="test")
         assert req.timeframe == "4h"
         assert req.conversation_history is None
 
     @pytest.mark.unit
-    def test_fundamental_request_defaults(self):
+    def test_fundamental_request_defaults(self, app_module):
         """FundamentalRequest should have correct defaults."""
-        from main import FundamentalRequest
-        req = FundamentalRequest(symbol="BTCUSDT")
+        req = app_module.FundamentalRequest(symbol="BTCUSDT")
         assert req.timeframe == "4h"
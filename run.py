@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 """
 Crypto RSI Heatmap - Single command launcher
-Usage: python3 run.py
+Usage: python3 run.py [--no-build] [--no-browser] [--no-parallel]
 """
+import argparse
+import hashlib
+import importlib.util
 import subprocess
 import sys
 import os
+import socket
 import time
 import threading
 import webbrowser
@@ -14,60 +18,154 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 BACKEND_DIR = os.path.join(BASE_DIR, 'backend')
 FRONTEND_DIR = os.path.join(BASE_DIR, 'frontend')
 REQUIREMENTS_FILE = os.path.join(BACKEND_DIR, 'requirements.txt')
+# Hash of requirements.txt (and interpreter) from the last successful install
+REQUIREMENTS_MARKER = os.path.join(BACKEND_DIR, '.requirements.hash')
+
+def requirements_hash():
+    """Hash requirements.txt together with the interpreter it is installed for"""
+    with open(REQUIREMENTS_FILE, 'rb') as f:
+        requirements = f.read()
+    return hashlib.sha256(sys.executable.encode() + b'\0' + requirements).hexdigest()
+
+def read_requirements_marker():
+    try:
+        with open(REQUIREMENTS_MARKER) as f:
+            return f.read().strip()
+    except OSError:
+        return None
 
 def install_dependencies():
-    """Install required packages if missing"""
-    required = ['fastapi', 'uvicorn', 'aiohttp', 'pandas', 'numpy']
-    missing = []
-    
-    for pkg in required:
-        try:
-            __import__(pkg)
-        except ImportError:
-            missing.append(pkg)
-    
+    """Install requirements.txt unless it is unchanged since the last install"""
+    digest = requirements_hash()
+    previous = read_requirements_marker()
+    if previous == digest:
+        return True
+
+    # find_spec locates packages without running their (heavy) imports
+    required = ['fastapi', 'uvicorn', 'httpx', 'h2', 'orjson', 'numpy']
+    missing = [pkg for pkg in required if importlib.util.find_spec(pkg) is None]
+
     if missing:
         print(f"Installing missing packages: {', '.join(missing)}")
-        subprocess.check_call([
-            sys.executable, '-m', 'pip', 'install', '-q',
-            '-r', REQUIREMENTS_FILE
-        ])
-        print("Dependencies installed")
+    elif previous is not None:
+        print("requirements.txt changed, updating packages")
+    else:
+        print("Checking dependencies...")
+
+    # Always install when the marker is missing or stale (a no-op if
+    # everything is satisfied); the probe above cannot see version pins
+    subprocess.check_call([
+        sys.executable, '-m', 'pip', 'install', '-q',
+        '-r', REQUIREMENTS_FILE
+    ])
+    print("Dependencies installed")
+
+    # Written only after pip succeeded
+    with open(REQUIREMENTS_MARKER, 'w') as f:
+        f.write(digest)
     return True
 
-def build_frontend():
-    """Build the React frontend"""
+def start_frontend_build():
+    """Start the React frontend build in the background"""
     print("Building frontend...")
-    subprocess.run(['npm', 'run', 'build'], cwd=FRONTEND_DIR, check=True)
+    return subprocess.Popen(['npm', 'run', 'build'], cwd=FRONTEND_DIR)
+
+def finish_frontend_build(build):
+    """Wait for a frontend build started by start_frontend_build"""
+    if build.wait() != 0:
+        raise subprocess.CalledProcessError(build.returncode, build.args)
     print("Frontend built successfully")
 
+def build_frontend():
+    """Build the React frontend"""
+    finish_frontend_build(start_frontend_build())
+
+def wait_for_server(host='127.0.0.1', port=8000, timeout=10.0):
+    """Poll until the server accepts connections; False if it never does"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.1):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
 def open_browser_delayed():
-    """Open browser after short delay to ensure backend is ready"""
-    time.sleep(2)
+    """Open browser as soon as the backend is accepting connections"""
+    if not wait_for_server():
+        print("Server is not answering yet, opening the browser anyway")
     webbrowser.open('http://localhost:8000')
     print("Browser opened: http://localhost:8000")
 
+def open_browser_in_background():
+    """Open the browser once the server is up, without blocking the launch"""
+    if not hasattr(os, 'fork'):
+        threading.Thread(target=open_browser_delayed, daemon=True).start()
+        return
+    # This process is about to exec uvicorn, which would kill a thread, so
+    # the wait happens in a double-forked process that nobody has to reap
+    sys.stdout.flush()
+    pid = os.fork()
+    if pid == 0:
+        if os.fork() == 0:
+            try:
+                open_browser_delayed()
+            finally:
+                os._exit(0)
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+def frontend_build_failed(error):
+    print(f"Failed to build frontend: {error}")
+    print("Try running: cd frontend && npm install && npm run build")
+    sys.exit(1)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build and serve the Crypto RSI Heatmap")
+    parser.add_argument('--no-build', action='store_true',
+                        help="serve the existing frontend build instead of rebuilding it")
+    parser.add_argument('--no-browser', action='store_true',
+                        help="do not open a browser once the server is up")
+    parser.add_argument('--no-parallel', action='store_true',
+                        help="install dependencies before building the frontend instead of alongside it")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+
     print("=" * 50)
     print("Crypto RSI Heatmap")
     print("=" * 50)
     
+    # pip and npm work on separate trees, so the frontend build can run
+    # while backend dependencies are checked/installed
+    build = None
+    if not args.no_build and not args.no_parallel:
+        try:
+            build = start_frontend_build()
+        except Exception as e:
+            frontend_build_failed(e)
+
     try:
         install_dependencies()
     except Exception as e:
+        if build is not None:
+            build.kill()
         print(f"Failed to install dependencies: {e}")
         print("Try running: pip install -r backend/requirements.txt")
         sys.exit(1)
     
     try:
-        build_frontend()
+        if build is not None:
+            finish_frontend_build(build)
+        elif not args.no_build:
+            build_frontend()
     except Exception as e:
-        print(f"Failed to build frontend: {e}")
-        print("Try running: cd frontend && npm install && npm run build")
-        sys.exit(1)
+        frontend_build_failed(e)
     
-    browser_thread = threading.Thread(target=open_browser_delayed, daemon=True)
-    browser_thread.start()
+    if not args.no_browser:
+        open_browser_in_background()
     
     print("Starting server on http://localhost:8000")
     print("-" * 50)
@@ -76,14 +174,22 @@ def main():
     
     os.chdir(BACKEND_DIR)
     
+    command = [
+        sys.executable, '-m', 'uvicorn',
+        'main:app',
+        '--host', '0.0.0.0',
+        '--port', '8000',
+        '--reload'
+    ]
+    if hasattr(os, 'fork'):
+        # Become uvicorn rather than waiting on it: frees this interpreter
+        # and Ctrl+C reaches the server directly
+        sys.stdout.flush()
+        os.execv(sys.executable, command)
+
+    # Windows has no real exec, so keep waiting on a child process there
     try:
-        subprocess.run([
-            sys.executable, '-m', 'uvicorn',
-            'main:app',
-            '--host', '0.0.0.0',
-            '--port', '8000',
-            '--reload'
-        ])
+        subprocess.run(command)
     except KeyboardInterrupt:
         print("\nServer stopped")
 